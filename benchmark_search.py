@@ -0,0 +1,248 @@
+"""
+Benchmarks for the search problems, to catch regressions and to compare
+different versions of a search (such as frontier implementations).
+
+Every benchmark solves one problem at a series of sizes. For each size we
+record the best time of a few runs, the peak memory of one more run (with
+tracemalloc, which slows it down, so it is not timed) and the number of
+nodes expanded, counted by wrapping the successors function.
+
+    python benchmark_search.py                      # run everything, print a table
+    python benchmark_search.py bridge pour          # only benchmarks with these words
+    python benchmark_search.py --quick -o new.json  # small sizes, save the results
+    python benchmark_search.py --baseline old.json  # compare; exit 1 on regressions
+
+The modules are scripts that run their tests (and profiles) when loaded,
+and some of those fail, so each one is run into a namespace of its own with
+its output suppressed; everything it defined before a failure can be used.
+A benchmark counts expansions by replacing a function in that namespace
+with a counting wrapper.
+"""
+
+import argparse, contextlib, io, json, os, sys, time, tracemalloc
+
+here = os.path.dirname(os.path.abspath(__file__))
+modules = {}    # {filename: namespace}
+
+def load(filename):
+    "Run the script filename (once) and return the namespace it defined."
+    if filename not in modules:
+        namespace = {'__name__': 'benchmark', '__file__': os.path.join(here, filename)}
+        with open(namespace['__file__']) as f:
+            code = compile(f.read(), namespace['__file__'], 'exec')
+        with contextlib.redirect_stdout(io.StringIO()):
+            try:
+                exec(code, namespace)
+            except Exception:
+                pass    # a failing test at import; what came before it is defined
+        modules[filename] = namespace
+    return modules[filename]
+
+# Counters. Each one wraps a function of a module so that every node
+# expanded adds one to counter[0].
+
+def count_calls(fn, counter):
+    "Wrap a successors function."
+    def _fn(*args):
+        counter[0] += 1
+        return fn(*args)
+    return _fn
+
+def count_search(search, counter):
+    "Wrap a search function, so that the successors given to it are counted."
+    def _search(start, successors, *args):
+        return search(start, count_calls(successors, counter), *args)
+    return _search
+
+def count_factory(factory, counter):
+    "Wrap a function that makes a successors function."
+    def _factory(*args, **kwargs):
+        return count_calls(factory(*args, **kwargs), counter)
+    return _factory
+
+def count_rows(bfs_row, counter):
+    "Wrap bfs_row of the subway; every station a row reaches is expanded."
+    def _bfs_row(graph, source):
+        dist, nexthop = bfs_row(graph, source)
+        counter[0] += sum(1 for d in dist if d >= 0)
+        return dist, nexthop
+    return _bfs_row
+
+# Problem generators.
+
+def walk(n):
+    "Successors for walking on an n by n grid, one square at a time."
+    def successors(state):
+        x, y = state
+        return dict(((x + dx, y + dy), name)
+                    for (dx, dy, name) in ((1, 0, 'E'), (-1, 0, 'W'), (0, 1, 'N'), (0, -1, 'S'))
+                    if 0 <= x + dx < n and 0 <= y + dy < n)
+    return successors
+
+def grid(n):
+    "A subway with a line along every row and column of an n by n grid."
+    return load('subway_planing_for_boston.py')['grid_city'](n)
+
+def glasses(k):
+    "The capacities of k glasses, and a goal that none of them can hold."
+    capacities = (3, 5, 7, 11, 13, 17)[:k]
+    return capacities, max(capacities) + 1
+
+def clear_subway_caches(ns):
+    ns['all_pairs'].cache.clear()
+    ns['transfer_graph'].cache.clear()
+
+# The benchmarks: (name, filename, counter, make, sizes, quick sizes), where
+# counter is (name of the function in the module, wrapper), or None if there
+# is no function to count with (expanded is then None), and make(ns, size)
+# returns the function of no arguments that solves the problem. mc_problem
+# only goes up to 3 people: with more there is no solution, and its
+# csuccessors leads to states with negative numbers of people without end.
+
+benchmarks = [
+    ('shortest_path_search grid', 'shortest_path_search.py',
+     ('shortest_path_search', count_search),
+     lambda ns, n: lambda: ns['shortest_path_search']((0, 0), walk(n),
+                                                      lambda state: state == (n - 1, n - 1)),
+     [10, 30, 100, 300], [10, 30]),
+    ('lowest_cost_search bridge', 'lowest_cost_search.py',
+     ('successors', count_calls),
+     lambda ns, n: lambda: ns['bridge_problem3'](range(1, n + 1)),
+     [4, 6, 8, 10], [4, 6]),
+    ('lowest_cost_search_slow bridge', 'lowest_cost_search.py',
+     ('successors', count_calls),
+     lambda ns, n: lambda: ns['bridge_problem3'](range(1, n + 1),
+                                                 ns['lowest_cost_search_slow']),
+     [4, 6, 8, 10], [4, 6]),
+    ('astar_search bridge', 'lowest_cost_search.py',
+     ('successors', count_calls),
+     lambda ns, n: lambda: ns['bridge_problem_astar'](range(1, n + 1)),
+     [4, 6, 8, 10], [4, 6]),
+    ('bridge_problem original', 'bridge_successors.py',
+     ('bsuccessors', count_calls),
+     lambda ns, n: lambda: ns['bridge_problem'](range(1, n + 1)),
+     [3, 4, 5], [3, 4]),
+    ('bridge_problem', 'bridge_successors_refactored.py',
+     ('bsuccessors2', count_calls),
+     lambda ns, n: lambda: ns['bridge_problem'](range(1, n + 1)),
+     [4, 6, 8, 10], [4, 6]),
+    ('bridge_problem_bits', 'bridge_successors_refactored.py',
+     ('bsuccessors_bits', count_factory),
+     lambda ns, n: lambda: ns['bridge_problem_bits'](range(1, n + 1)),
+     [4, 6, 8, 10, 15, 20], [4, 6]),
+    ('pour_problem', 'pouringWaterProblem.py',
+     ('successors', count_calls),
+     lambda ns, n: lambda: ns['pour_problem'](n, n - 1, 2 * n),
+     [10, 100, 1000], [10, 100]),
+    ('more_pour_problem', 'more_pour_problem.py',
+     ('shortest_path_search', count_search),
+     lambda ns, k: lambda: ns['more_pour_problem'](*glasses(k)),
+     [2, 3, 4, 5], [2, 3]),
+    ('more_pour_problem slow', 'more_pour_problem.py',
+     ('shortest_path_search_slow', count_search),
+     lambda ns, k: lambda: ns['more_pour_problem'](*glasses(k), None,
+                                                   ns['shortest_path_search_slow']),
+     [2, 3, 4, 5], [2, 3]),
+    ('mc_problem', 'missionariesAndCannibals.py',
+     ('csuccessors', count_calls),
+     lambda ns, n: lambda: ns['mc_problem']((n, n, 1, 0, 0, 0)),
+     [2, 3], [2, 3]),
+    ('mc_general', 'missionariesAndCannibals.py', None,
+     lambda ns, n: lambda: ns['mc_general'](n, n, 4),
+     [10, 100, 1000], [10, 100]),
+    ('ride boston', 'subway_planing_for_boston.py',
+     ('shortest_path_search', count_search),
+     lambda ns, n: lambda: [ns['ride'](a, b) for a in sorted(ns['boston'])[:n]
+                            for b in ns['boston']],
+     [5, 15, 35], [5]),
+    ('transfer_ride grid', 'subway_planing_for_boston.py',
+     ('astar_search', count_search),
+     lambda ns, n: (lambda system: lambda: [ns['transfer_ride'](a, b, system, 3)
+                                            for a in sorted(system)[:n] for b in system]
+                    )(grid(n)),
+     [5, 10, 20], [5]),
+    ('longest_ride grid', 'subway_planing_for_boston.py',
+     ('bfs_row', count_rows),
+     lambda ns, n: (lambda system: lambda: (clear_subway_caches(ns),
+                                            ns['longest_ride'](system)))(grid(n)),
+     [5, 10, 20], [5, 10]),
+]
+
+def measure(name, filename, counter, make, size, repeat):
+    "Run one benchmark at one size; return its record."
+    ns = load(filename)
+    fn_name, wrapper = counter or (None, None)
+    original = ns.get(fn_name)
+    solve = make(ns, size)
+    seconds = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        solve()
+        seconds = min(seconds, time.perf_counter() - t0)
+    count = [0]
+    if counter:
+        ns[fn_name] = wrapper(original, count)
+    try:
+        tracemalloc.start()
+        solve()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        if counter:
+            ns[fn_name] = original
+    return {'benchmark': name, 'size': size, 'seconds': seconds,
+            'peak_bytes': peak, 'expanded': count[0] if counter else None}
+
+def run(words=(), quick=False, repeat=3):
+    "Run the benchmarks whose names contain all of words; print and return the records."
+    records = []
+    print("%-32s %6s %12s %12s %10s" % ("benchmark", "size", "seconds", "peak", "expanded"))
+    for (name, filename, counter, make, sizes, quick_sizes) in benchmarks:
+        if not all(word in name for word in words):
+            continue
+        for size in (quick_sizes if quick else sizes):
+            r = measure(name, filename, counter, make, size, repeat)
+            records.append(r)
+            print("%-32s %6d %12.6f %11dK %10s" % (name, size, r['seconds'],
+                                                   r['peak_bytes'] // 1024, r['expanded']))
+            sys.stdout.flush()
+    return records
+
+def compare(records, baseline, tolerance):
+    """Print the records that are worse than in baseline: slower by more than
+    the tolerance (a fraction), or expanding more nodes. Return their number."""
+    old = dict(((r['benchmark'], r['size']), r) for r in baseline)
+    regressions = 0
+    for r in records:
+        b = old.get((r['benchmark'], r['size']))
+        if b is None:
+            continue
+        ratio = r['seconds'] / max(b['seconds'], 1e-9)
+        if ratio > 1 + tolerance or (r['expanded'] or 0) > (b['expanded'] or 0):
+            regressions += 1
+            print("REGRESSION %s %d: %.2fx the time, %s expanded (was %s)"
+                  % (r['benchmark'], r['size'], ratio, r['expanded'], b['expanded']))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('words', nargs='*', help='only run benchmarks with these words in their names')
+    parser.add_argument('--quick', action='store_true', help='only the small sizes')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per size (the best counts)')
+    parser.add_argument('-o', '--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='compare with the results in this JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='the slowdown that counts as a regression (default 0.25)')
+    args = parser.parse_args(argv)
+    records = run(args.words, args.quick, args.repeat)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(records, f, indent=1)
+    if args.baseline:
+        with open(args.baseline) as f:
+            if compare(records, json.load(f), args.tolerance):
+                return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -19,7 +19,8 @@ path            list of [state, (action, t), state, (action,t ), ... ]
                     with t...total time elapsed
 successor       dictionary of {state:action} pairs
 """
-import cProfile
+import cProfile, heapq, itertools, os, tempfile, time
+from search_cache import disk_memo
 
 def bsuccessors2(state):
     """Return a dict of {state:action} pairs. A state is a
@@ -66,9 +67,14 @@ def bridge_problem(here):
     explored = set() # set of states we have visited
     # State will be a (peoplelight_here, peoplelight_there, time_elapsed)
     # E.g. ({1, 2, 5, 10, 'light'}, {}, 0)
-    frontier = [ [(here, frozenset())] ] # ordered list of paths we have blazed
+    frontier = []    # heap of [path_cost, count, path] entries
+    best = {}        # {state: entry} for the best path to each state
+    count = itertools.count()
+    add_to_frontier(frontier, best, count, [(here, frozenset())])
     while frontier:
-        path = frontier.pop(0)
+        path = pop_frontier(frontier, best)
+        if path is None:    # only replaced entries were left
+            break
         here1, there1 = state1 = final_state(path)
         if not here1 or (len(here1)==1 and 'light' in here1):  ## That is, nobody left here
             return path
@@ -80,30 +86,35 @@ def bridge_problem(here):
             if state not in explored:
                 total_cost = pcost + bcost(action)
                 path2 = path + [(action, total_cost), state]
-                add_to_frontier(frontier, path2)
+                add_to_frontier(frontier, best, count, path2)
     return Fail
 Fail = []
 
 def final_state(path): return path[-1]
 
-def add_to_frontier(frontier, path):
-    "Add path to frontier, replacing costlier path if ther is one."
-    # (This could be done more efficiently).
-    # Find if there is an old path to the final state of this path. If 2 paths
-    # have the same final state we just want to keep the path with the lowest
-    # cost. 
-    old = None
-    for i,p in enumerate(frontier):
-        if final_state(p) == final_state(path):
-            old = i
-            break
-    if old is not None and path_cost(frontier[old]) < path_cost(path):
+def add_to_frontier(frontier, best, count, path):
+    """Add path to the frontier heap, replacing costlier path if ther is one.
+    If 2 paths have the same final state we just want to keep the path with
+    the lowest cost. The old entry stays in the heap, but is no longer the
+    best entry for its state, so pop_frontier skips it (lazy deletion)."""
+    state = final_state(path)
+    old = best.get(state)
+    if old is not None and old[0] < path_cost(path):
         return  # Old path was better, do nothing
-    elif old is not None:
-        del frontier[old]   # old path was worse; delete it
-    
-    ## Now add the new path and re-sort
-    frontier.append(path)
+    entry = [path_cost(path), next(count), path]
+    best[state] = entry
+    heapq.heappush(frontier, entry)
+
+def pop_frontier(frontier, best):
+    """Remove and return the cheapest path from the frontier heap, skipping
+    entries that have been replaced by a cheaper path to the same state."""
+    while frontier:
+        entry = heapq.heappop(frontier)
+        state = final_state(entry[2])
+        if best.get(state) is entry:
+            del best[state]
+            return entry[2]
+    return None
 
 #cProfile.run("print(path_states(bridge_problem([4,3,7,5])))")
 
@@ -129,3 +140,275 @@ def test2():
     
     return 'tests pass'
 print(test2())
+
+# Solutions on disk, saved by disk_memo (see search_cache.py).
+
+@disk_memo(key=lambda here: tuple(sorted(set(here))))
+def cached_bridge_problem(here):
+    """bridge_problem, with the solutions kept on disk. People are a set of
+    times, so the key is the sorted times without repeats."""
+    return bridge_problem(here)
+
+def test_disk_memo():
+    key = lambda here: tuple(sorted(set(here)))
+    calls = []
+    def solve(here):
+        calls.append(here)
+        return bridge_problem(here)
+    with tempfile.TemporaryDirectory() as folder:
+        cached = disk_memo(key, (bsuccessors2,), folder)(solve)
+        assert cached([4, 3, 7, 5]) == bridge_problem([4, 3, 7, 5])
+        assert cached([5, 7, 3, 4, 4]) == bridge_problem([4, 3, 7, 5])
+        assert len(calls) == 1
+        # A new process (a new wrapper) finds the saved solution.
+        assert disk_memo(key, (bsuccessors2,), folder)(solve)([3, 4, 5, 7])
+        assert len(calls) == 1
+        # When a function the solution depends on changes, it is stale.
+        changed = disk_memo(key, (bsuccessors2, bcost), folder)(solve)
+        assert changed([4, 3, 7, 5]) == bridge_problem([4, 3, 7, 5])
+        assert len(calls) == 2
+        assert cached([4, 3, 7, 5]) and len(calls) == 3
+        assert len(os.listdir(folder)) == 1
+        # Keyword arguments are part of the key too.
+        keywords = disk_memo(None, (bsuccessors2,), folder)(solve)
+        assert keywords(here=[1, 2]) == keywords(here=[1, 2]) == bridge_problem([1, 2])
+        assert len(calls) == 4 and len(os.listdir(folder)) == 2
+        # A folder that others can write to is not loaded from (or saved to).
+        shared = os.path.join(folder, 'shared')
+        os.mkdir(shared)
+        os.chmod(shared, 0o777)
+        assert disk_memo(key, (bsuccessors2,), shared)(solve)([1, 2]) == bridge_problem([1, 2])
+        assert len(calls) == 5 and os.listdir(shared) == []
+    return 'test_disk_memo passes'
+
+print(test_disk_memo())
+
+
+
+# -----------------
+# Bitmask representation
+#
+# For larger crossings the frozensets get expensive: every successor builds
+# two new frozensets, and both (a, b) and (b, a) are generated. Here the
+# people are numbered 0..n-1 in order of their times (times[i] is the time
+# of person i) and a state is a (here, light) tuple, where bit i of the int
+# here is set if person i is on the here side, and light is 0 if the light
+# is on the here side and 1 if it is on the there side.
+
+def bsuccessors_bits(times, normal_form=False):
+    """Return a successors function for bitmask states of the bridge problem
+    with the given (sorted) times. The moves, one for every unordered pair
+    of people (a person crossing alone is the pair (i, i)), are computed
+    once, not on every call. Actions are (a, b, arrow) tuples, as before.
+    With normal_form, only moves of the form that optimal solutions can
+    always be given are generated: two people cross to the there side
+    (unless just one is left), and they are the slowest person still on
+    the here side with someone else, or the two fastest people; one person
+    alone brings the light back."""
+    n = len(times)
+    full = (1 << n) - 1
+    pairs = [((1 << i) | (1 << j), times[j], times[i])
+             for i in range(n) for j in range(i + 1, n)]
+    singles = [(1 << i, times[i], times[i]) for i in range(n)]
+    forward = pairs if normal_form else singles + pairs
+    back = singles if normal_form else singles + pairs
+    def successors(state):
+        here, light = state
+        if light == 0:
+            if not normal_form:
+                return dict(((here & ~mask, 1), (a, b, '->'))
+                            for (mask, a, b) in forward if mask & here == mask)
+            if not here & (here - 1):   # just one person left
+                return {(0, 1): (times[here.bit_length() - 1],) * 2 + ('->',)}
+            slowest = 1 << (here.bit_length() - 1)
+            return dict(((here & ~mask, 1), (a, b, '->'))
+                        for (mask, a, b) in forward
+                        if mask & here == mask and (mask & slowest or mask == 3))
+        else:
+            there = full & ~here
+            return dict(((here | mask, 0), (a, b, '<-'))
+                        for (mask, a, b) in back if mask & there == mask)
+    return successors
+
+def bridge_problem_bits(here, canonical=False, stats=None):
+    """Find the fastest (least elapsed time) path to the goal in the bridge
+    problem, using bitmask states. The path is [state, (action, total_cost),
+    state, ...] with bitmask states; see bits_path_to_sets. With canonical,
+    people with the same time are interchangeable (see bridge_canonical).
+    If stats is a dict, stats['expanded'] counts the states expanded."""
+    times = sorted(here)
+    successors = bsuccessors_bits(times, normal_form=True)
+    key = bridge_canonical(times) if canonical else (lambda state: state)
+    start = ((1 << len(times)) - 1, 0)
+    h = lambda state: bridge_bound(state, times)
+    cost = {start: 0}           # {key(state): lowest known cost}
+    parents = {start: None}     # {key(state): (previous_state, action)}
+    frontier = [(h(start), 0, start, 0)]
+    count = itertools.count(1)
+    while frontier:
+        _, _, state1, cost1 = heapq.heappop(frontier)
+        if cost1 > cost[key(state1)]:
+            continue    # we found a cheaper path to state1 after this entry
+        if state1[0] == 0:
+            return bits_path(parents, cost, state1, key)
+        if stats is not None:
+            stats['expanded'] = stats.get('expanded', 0) + 1
+        for (state, action) in successors(state1).items():
+            total_cost = cost1 + bcost(action)
+            k = key(state)
+            if total_cost < cost.get(k, total_cost + 1):
+                cost[k] = total_cost
+                parents[k] = (state1, action)
+                heapq.heappush(frontier, (total_cost + h(state), next(count), state, total_cost))
+    return Fail
+
+def bridge_bound(state, times):
+    """A lower bound on the time still needed from a bitmask state (an
+    admissible A* heuristic). The people on the here side cross at best
+    in pairs of the slowest two, the next slowest two and so on, and each
+    trip back takes at least as long as the fastest person."""
+    here, light = state
+    if here == 0:
+        return 0
+    left = [t for i, t in enumerate(times) if here & (1 << i)]
+    trips = (len(left) + 1) // 2
+    backs = trips - 1 + light
+    return sum(left[-1::-2]) + backs * times[0]
+
+def bridge_canonical(times):
+    """Return a canonical(state) function for bitmask states with the given
+    (sorted) times. People with equal times can be swapped, so within each
+    run of equal times the people on the here side are moved to the lowest
+    bits of the run."""
+    runs = []                   # [(mask of the run, lowest bit of the run)]
+    for i, t in enumerate(times):
+        if i > 0 and times[i - 1] == t:
+            runs[-1] = (runs[-1][0] | (1 << i), runs[-1][1])
+        else:
+            runs.append((1 << i, i))
+    runs = [(mask, low) for (mask, low) in runs if mask >> low != 1]
+    def canonical(state):
+        here, light = state
+        for (mask, low) in runs:
+            n = bin(here & mask).count('1')
+            here = (here & ~mask) | (((1 << n) - 1) << low)
+        return (here, light)
+    return canonical
+
+def bits_path(parents, cost, state, key=lambda state: state):
+    """Follow the parents dict back from state; return the path with total
+    costs. parents and cost are keyed by key(state)."""
+    path = [state]
+    while parents[key(state)] is not None:
+        previous, action = parents[key(state)]
+        path += [(action, cost[key(state)]), previous]
+        state = previous
+    path.reverse()
+    return path
+
+def bits_to_sets(state, times):
+    "Convert a bitmask state to the (here, there) frozenset form of bsuccessors2."
+    here, light = state
+    side = lambda bits: frozenset(t for i, t in enumerate(times) if bits & (1 << i))
+    here, there = side(here), side(((1 << len(times)) - 1) & ~here)
+    if light == 0:
+        return (here | frozenset(['light']), there)
+    else:
+        return (here, there | frozenset(['light']))
+
+def sets_to_bits(state, times):
+    "Convert a (here, there) frozenset state to a bitmask state."
+    here, there = state
+    bits = sum(1 << i for i, t in enumerate(times) if t in here)
+    return (bits, 0 if 'light' in here else 1)
+
+def bits_path_to_sets(path, times):
+    "Convert a path of bridge_problem_bits to the form of bridge_problem."
+    return [bits_to_sets(x, times) if i % 2 == 0 else x
+            for i, x in enumerate(path)]
+
+def test_bits():
+    times = [1, 2, 5, 10]
+    successors = bsuccessors_bits(times)
+    assert successors((0b0011, 0)) == {
+            (0b0001, 1): (2, 2, '->'),
+            (0b0010, 1): (1, 1, '->'),
+            (0b0000, 1): (2, 1, '->')}
+    assert successors((0b1100, 1)) == {
+            (0b1101, 0): (1, 1, '<-'),
+            (0b1110, 0): (2, 2, '<-'),
+            (0b1111, 0): (2, 1, '<-')}
+    for state in [(frozenset([1, 2, 'light']), frozenset([5, 10])),
+                  (frozenset([10]), frozenset([1, 2, 5, 'light']))]:
+        assert bits_to_sets(sets_to_bits(state, times), times) == state
+        assert (set(bsuccessors2(state)) ==
+                set(bits_to_sets(s, times) for s in successors(sets_to_bits(state, times))))
+    assert path_cost(bridge_problem_bits([1, 2, 5, 10])) == 17
+    assert path_cost(bridge_problem_bits([1, 2, 5, 10, 15, 20])) == 42
+    assert [path_cost(bridge_problem_bits([1,2,4,8,16][:N])) for N in range(6)] == [
+            0, 1, 2, 7, 15, 28]
+    # Unlike frozensets, bitmasks can hold two people with the same time
+    assert path_cost(bridge_problem_bits([1, 1, 2])) == 4
+    assert path_cost(bridge_problem_bits(range(1, 21))) == 155
+    normal = bsuccessors_bits(times, normal_form=True)
+    assert normal((0b1111, 0)) == {
+            (0b0110, 1): (10, 1, '->'),
+            (0b0011, 1): (10, 5, '->'),
+            (0b0101, 1): (10, 2, '->'),
+            (0b1100, 1): (2, 1, '->')}
+    assert normal((0b1000, 0)) == {(0b0000, 1): (10, 10, '->')}
+    assert normal((0b1100, 1)) == {(0b1101, 0): (1, 1, '<-'), (0b1110, 0): (2, 2, '<-')}
+    path = bits_path_to_sets(bridge_problem_bits([1, 2, 5, 10]), times)
+    assert path[0] == (frozenset([1, 2, 5, 10, 'light']), frozenset())
+    assert path[-1] == (frozenset(), frozenset([1, 2, 5, 10, 'light']))
+    canonical = bridge_canonical([1, 2, 2, 2, 5, 5])
+    assert canonical((0b101010, 1)) == (0b010110, 1)
+    assert canonical((0b000011, 0)) == (0b000011, 0)
+    for here in ([1, 1, 2], [1, 2, 2, 2, 5, 5], [3, 3, 3, 3, 3, 3], [1, 2, 5, 10]):
+        path = bridge_problem_bits(here, canonical=True)
+        assert path_cost(path) == path_cost(bridge_problem_bits(here))
+        assert all(path[i+2] in normal_successors(here)(path[i])
+                   for i in range(0, len(path) - 2, 2))
+    return 'test_bits passes'
+
+def normal_successors(here):
+    return bsuccessors_bits(sorted(here), normal_form=True)
+
+print(test_bits())
+
+def throughput(n, seconds=1.0):
+    """Expand bridge states with n people breadth first for about the given
+    time, with bsuccessors2 and with the bitmask successors; return the
+    number of states expanded per second for each."""
+    times = list(range(1, n + 1))
+    full = (frozenset(times) | frozenset(['light']), frozenset())
+    result = []
+    for successors, start in [(bsuccessors2, full),
+                              (bsuccessors_bits(times), sets_to_bits(full, times))]:
+        explored, frontier, expanded = set([start]), [start], 0
+        t0 = time.perf_counter()
+        while frontier and time.perf_counter() - t0 < seconds:
+            for state in successors(frontier.pop(0)):
+                if state not in explored:
+                    explored.add(state)
+                    frontier.append(state)
+            expanded += 1
+        result.append(expanded / (time.perf_counter() - t0))
+    return result
+
+#for n in (6, 10, 15, 20): print(n, "people: %8.0f sets/s %8.0f bits/s" % tuple(throughput(n)))
+#cProfile.run("print(path_cost(bridge_problem_bits(range(1, 21))))")
+
+def symmetry_reduction(problems=([1, 1, 2, 2, 5, 5, 10, 10], [1, 2] + [7] * 10,
+                                 [3] * 14, [1, 2, 3] * 5)):
+    "Print the number of states expanded without and with bridge_canonical."
+    print("%-40s %8s %10s" % ("times", "states", "canonical"))
+    for here in problems:
+        counts = []
+        for canonical in (False, True):
+            stats = {}
+            bridge_problem_bits(here, canonical, stats)
+            counts.append(stats['expanded'])
+        print("%-40s %8d %10d" % (here, counts[0], counts[1]))
+
+#symmetry_reduction()
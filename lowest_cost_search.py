@@ -12,22 +12,224 @@ inventory:
     paths       [state, action, state, ...]
     states      atomic
     actions     atomic
-    successors  function(state) -> {state:action}
+    successors  function(state) -> {state:action}, or an iterable of
+                (state, action) pairs, such as a generator
     start       atomic state
     goal        function(state) -> bool
     action_cost function(action)
     path_cost
 
 -> lowest_cost_search(start, successors, goal, action_cost) -> path
+-> lowest_cost_search(start, successors, goal, action_cost, stats=True) -> (path, stats)
+
+    heuristic   function(state) -> estimate of the remaining cost
+
+-> astar_search(start, successors, goal, action_cost, heuristic) -> path
+-> ida_star_search(start, successors, goal, action_cost, heuristic) -> path
+
+    canonical   function(state) -> key shared by all equivalent states
+
+-> lowest_cost_search(start, successors, goal, action_cost, canonical=canonical) -> path
 """
 
 
-def lowest_cost_search(start, successors, is_goal, action_cost):
+import heapq, itertools, time
+
+def lowest_cost_search(start, successors, is_goal, action_cost, stats=False,
+                       canonical=None):
     """Return the lowest cost path, starting from start state,
     and considering successors(state) => {state:action,...},
     that ends in a state for which is_goal(state) is true,
     where the cost of a path is the sum of action costs,
-    which are given by action_cost(action)."""
+    which are given by action_cost(action).
+    With stats=True return a (path, stats) tuple; see astar_search."""
+    return astar_search(start, successors, is_goal, action_cost, no_heuristic, stats,
+                        canonical)
+
+def no_heuristic(state): return 0
+
+def astar_search(start, successors, is_goal, action_cost, heuristic, stats=False,
+                 canonical=None):
+    """Like lowest_cost_search, but the frontier is ordered by the path cost
+    plus heuristic(state), an estimate of the cost still needed to reach the
+    goal. If the heuristic never overestimates (it is admissible) and never
+    drops by more than the cost of an action (it is consistent), the result
+    is still a lowest cost path, but fewer states are expanded.
+    With stats=True return a (path, stats) tuple instead, where stats is a
+    dict as made by new_stats, filled in by the search. If canonical is
+    given, states with the same canonical(state) are treated as one state;
+    they must have the same cost to the goal."""
+    if stats:
+        stats = new_stats()
+        path = best_first_search(start, timed(successors, stats, 'successors_time'),
+                                 timed(is_goal, stats, 'is_goal_time'),
+                                 action_cost, heuristic, stats, canonical)
+        return path, stats
+    return best_first_search(start, successors, is_goal, action_cost, heuristic,
+                             None, canonical)
+
+def best_first_search(start, successors, is_goal, action_cost, heuristic, stats=None,
+                      canonical=None):
+    "The search of astar_search; if stats is a dict, count in it."
+    Fail = []
+    key = canonical or identity
+    explored = set()        # set of key(state)s we have visited
+    frontier = []           # heap of [path_cost + heuristic, count, path] entries
+    best = {}               # {key(state): entry} for the best path to each state
+    count = itertools.count()
+    push_frontier(frontier, best, count, [start], heuristic(start), key)
+    while frontier:
+        path = pop_frontier(frontier, best, key)
+        if path is None:    # only replaced entries were left
+            break
+        state1 = final_state(path)
+        if is_goal(state1):  
+            return path
+        explored.add(key(state1))
+        pcost = path_cost(path)
+        succ = successors(state1)
+        if stats is not None:
+            count_expansion(stats, succ, len(frontier) + 1, len(explored))
+            if not isinstance(succ, dict):
+                succ = counted(succ, stats)
+        for (state, action) in successor_pairs(succ):
+            if key(state) not in explored:
+                total_cost = pcost + action_cost(action)
+                path2 = path + [(action, total_cost), state]
+                if (not push_frontier(frontier, best, count, path2, heuristic(state), key)
+                    and stats is not None):
+                    stats['duplicates'] += 1
+            elif stats is not None:
+                stats['duplicates'] += 1
+    return Fail
+
+def new_stats():
+    """A dict of search statistics: the number of states expanded, successors
+    generated and successors pruned because we already had a path to them
+    that was no worse, the peak number of entries in the frontier heap and
+    of explored states, and the seconds spent in successors and is_goal."""
+    return dict(expanded=0, generated=0, duplicates=0, frontier_peak=0,
+                explored=0, successors_time=0.0, is_goal_time=0.0)
+
+def count_expansion(stats, succ, frontier, explored):
+    """Count the expansion of a state with successors succ in stats. If succ
+    is not a dict, its pairs are counted as they are generated; see counted."""
+    stats['expanded'] += 1
+    if isinstance(succ, dict):
+        stats['generated'] += len(succ)
+    stats['frontier_peak'] = max(stats['frontier_peak'], frontier)
+    stats['explored'] = explored
+
+def counted(pairs, stats):
+    "Generate the pairs, counting each one in stats['generated']."
+    for pair in pairs:
+        stats['generated'] += 1
+        yield pair
+
+def successor_pairs(succ):
+    """The (state, action) pairs of what successors returned: either a
+    {state:action} dict or an iterable of pairs, such as a generator."""
+    return succ.items() if isinstance(succ, dict) else succ
+
+def timed(fn, stats, key):
+    "Return a function that calls fn and adds the time it took to stats[key]."
+    def _fn(*args):
+        t0 = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            stats[key] += time.perf_counter() - t0
+    return _fn
+
+def ida_star_search(start, successors, is_goal, action_cost, heuristic,
+                    table_size=0):
+    """Like astar_search, but with depth first searches that are bounded by
+    the path cost plus heuristic(state). Each time the bound grows to the
+    smallest value that went over it. That takes more time, but memory only
+    linear in the length of the path. table_size bounds an optional
+    transposition table of {state: path_cost} that prunes states we have
+    already reached more cheaply (None means no bound)."""
+    bound = heuristic(start)
+    while bound < infinity:
+        path, bound = cost_limited_search(start, successors, is_goal, action_cost,
+                                          heuristic, bound, table_size)
+        if path:
+            return path
+    return []
+
+infinity = float('inf')
+
+def cost_limited_search(start, successors, is_goal, action_cost, heuristic,
+                        bound, table_size):
+    """Depth first search for a goal state, not following paths whose cost
+    plus heuristic is over bound. Return (path, next_bound), where path is
+    [] if there is none and next_bound is the smallest cost plus heuristic
+    that was over bound."""
+    if is_goal(start):
+        return [start], bound
+    path = [start]              # the path to the state we are expanding
+    on_path = set(path)         # states on path, so we do not go in circles
+    table = {start: 0}          # {state: lowest cost we reached it with}
+    stack = [iter(successor_pairs(successors(start)))]
+    next_bound = infinity
+    while stack:
+        pcost = path_cost(path)
+        for (state, action) in stack[-1]:
+            total_cost = pcost + action_cost(action)
+            if state in on_path or table.get(state, infinity) <= total_cost:
+                continue
+            f = total_cost + heuristic(state)
+            if f > bound:
+                next_bound = min(next_bound, f)
+                continue
+            if is_goal(state):
+                return path + [(action, total_cost), state], bound
+            if table_size is None or len(table) < table_size or state in table:
+                table[state] = total_cost
+            path += [(action, total_cost), state]
+            on_path.add(state)
+            stack.append(iter(successor_pairs(successors(state))))
+            break
+        else:
+            stack.pop()
+            on_path.discard(path[-1])
+            del path[-2:]
+    return [], next_bound
+
+def final_state(path): return path[-1]
+
+def identity(state): return state
+
+def push_frontier(frontier, best, count, path, h=0, key=identity):
+    """Add path to the frontier heap, replacing costlier path if there is one.
+    The old entry is not removed from the heap; it is just no longer the best
+    entry for its state and will be skipped by pop_frontier (lazy deletion).
+    h is the heuristic estimate for the final state of the path, and best
+    is keyed by key(state). Return True if the path was added."""
+    state = key(final_state(path))
+    old = best.get(state)
+    if old is not None and path_cost(old[2]) < path_cost(path):
+        return False # Old path was better; do nothing
+    entry = [path_cost(path) + h, next(count), path]
+    best[state] = entry
+    heapq.heappush(frontier, entry)
+    return True
+
+def pop_frontier(frontier, best, key=identity):
+    """Remove and return the cheapest path from the frontier heap, skipping
+    entries that have been replaced by a cheaper path to the same state."""
+    while frontier:
+        entry = heapq.heappop(frontier)
+        path = entry[2]
+        state = key(final_state(path))
+        if best.get(state) is entry:
+            del best[state]
+            return path
+    return None
+
+def lowest_cost_search_slow(start, successors, is_goal, action_cost):
+    """The original version of lowest_cost_search, which keeps the frontier
+    as a sorted list. Kept as a reference for benchmark()."""
     Fail = []
     explored = set()        # set of states we have visited
     frontier = [ [start] ]  # ordered list of paths we have blazed
@@ -45,8 +247,6 @@ def lowest_cost_search(start, successors, is_goal, action_cost):
                 add_to_frontier(frontier, path2)
     return Fail
 
-def final_state(path): return path[-1]
-
 def add_to_frontier(frontier, path):
     "Add path to frontier, replacing costlier path if there is one."
     # (This could be done more efficiently.)
@@ -68,7 +268,7 @@ def add_to_frontier(frontier, path):
     
 
 # Verification with bridge problem
-def bridge_problem3(here):
+def bridge_problem3(here, search=lowest_cost_search):
     """Find the fastest (least elapsed time) path to 
     the goal in the bridge problem."""
     start = (frozenset(here) | frozenset(['light']), frozenset())
@@ -77,7 +277,7 @@ def bridge_problem3(here):
         here, ther = state
         return not here or here == set(['light'])
     
-    return lowest_cost_search(start, successors, is_goal, action_cost) 
+    return search(start, successors, is_goal, action_cost) 
 
 def successors(state):
     """Return a dict of {state:action} pairs.  A state is a (here, there) tuple,
@@ -112,6 +312,17 @@ def action_cost(action):
     a, b, arrow = action
     return max(a, b)
 
+def bridge_heuristic(state):
+    """An admissible heuristic for the bridge problem: the slowest person
+    still on the here side has to cross at least once, and that takes at
+    least as long as their own time."""
+    here, there = state
+    return max([p for p in here if p != 'light'] or [0])
+
+def bridge_problem_astar(here):
+    "Find the fastest path in the bridge problem with A* search."
+    return bridge_problem3(here, lambda *args: astar_search(*args, heuristic=bridge_heuristic))
+
 
 
 def test():
@@ -128,6 +339,87 @@ def test():
             (frozenset([1, 2, 'light']), frozenset([10, 5])), 
             ((2, 1, '->'), 17), 
             (frozenset([]), frozenset([1, 10, 2, 5, 'light']))]
+    assert path_cost(bridge_problem_astar(here)) == 17
+    start = (frozenset(here) | frozenset(['light']), frozenset())
+    is_goal = lambda state: not state[0] or state[0] == set(['light'])
+    path, stats = lowest_cost_search(start, successors, is_goal, action_cost, stats=True)
+    assert path == lowest_cost_search(start, successors, is_goal, action_cost)
+    assert stats['expanded'] == stats['explored'] == 25
+    assert stats['generated'] > stats['duplicates'] > 0
+    assert 0 < stats['frontier_peak'] < stats['generated']
+    path, astar = astar_search(start, successors, is_goal, action_cost,
+                               bridge_heuristic, stats=True)
+    assert path_cost(path) == 17 and astar['expanded'] < stats['expanded']
+    for here in ([], [10], [1, 2, 5, 10, 15, 20], [1, 2, 4, 8, 16, 32], [0, 9, 6, 4, 2]):
+        assert (path_cost(bridge_problem_astar(here)) ==
+                path_cost(bridge_problem3(here)))
+    for table_size in (0, 1000, None):
+        ida_star = lambda *args: ida_star_search(*args, heuristic=bridge_heuristic,
+                                                 table_size=table_size)
+        for here in ([], [10], [1, 2, 5, 10], [1, 2, 5, 10, 15], [0, 9, 6, 4, 2]):
+            assert (path_cost(bridge_problem3(here, ida_star)) ==
+                    path_cost(bridge_problem3(here)))
+    # Walking a line: a step right or left costs 1, a jump of 3 costs 2. The
+    # line is symmetric around 0, so -x and x can share a key.
+    line = lambda x: {x+1: 1, x-1: 1, x+3: 2, x-3: 2}
+    goal = lambda x: abs(x) == 7
+    path, stats = lowest_cost_search(0, line, goal, lambda a: a, stats=True)
+    path2, stats2 = lowest_cost_search(0, line, goal, lambda a: a, stats=True,
+                                       canonical=abs)
+    assert path_cost(path) == path_cost(path2) == 5
+    assert stats2['explored'] < stats['explored']
+    lazy = lambda x: ((x + d, abs(d) // 2 + 1) for d in (1, -1, 3, -3))
+    path3, stats3 = lowest_cost_search(0, lazy, goal, lambda a: a, stats=True)
+    assert path3 == path and stats3['generated'] == stats['generated']
+    assert path_cost(ida_star_search(0, lazy, goal, lambda a: a, no_heuristic, None)) == 5
+    # An unreachable goal, with a replaced entry left on the frontier.
+    graph = {'a': {'b': 5, 'c': 1}, 'c': {'b': 1}, 'b': {}}
+    for search in (lowest_cost_search, lowest_cost_search_slow):
+        assert search('a', graph.__getitem__, lambda s: s == 'z', lambda a: a) == []
     return 'test passes'
 
 print(test())
+
+def timedcall(fn, *args):
+    "Call function with args; return the time in seconds and result."
+    t0 = time.perf_counter()
+    result = fn(*args)
+    t1 = time.perf_counter()
+    return t1-t0, result
+
+def benchmark(sizes=range(2, 10)):
+    """Compare the heap frontier of lowest_cost_search with the sorted list
+    frontier of lowest_cost_search_slow on growing bridge problems."""
+    print("%3s %10s %10s %8s" % ("n", "list", "heap", "speedup"))
+    for n in sizes:
+        here = [2**i for i in range(n)]
+        t_list, path1 = timedcall(bridge_problem3, here, lowest_cost_search_slow)
+        t_heap, path2 = timedcall(bridge_problem3, here, lowest_cost_search)
+        assert path_cost(path1) == path_cost(path2)
+        print("%3d %9.4fs %9.4fs %7.1fx" % (n, t_list, t_heap, t_list / t_heap))
+
+#benchmark()
+
+def countcalls(f):
+    "Return a function that calls f and counts the calls in its .calls attribute."
+    def _f(*args):
+        _f.calls += 1
+        return f(*args)
+    _f.calls = 0
+    return _f
+
+def compare_expansions(sizes=range(4, 12)):
+    """Compare the number of expanded states (calls to successors) and the time
+    needed by uniform cost search and by A* search with bridge_heuristic."""
+    print("%3s %8s %8s %10s %10s" % ("n", "ucs", "A*", "ucs time", "A* time"))
+    for n in sizes:
+        start = (frozenset(2**i for i in range(n)) | frozenset(['light']), frozenset())
+        is_goal = lambda state: not state[0] or state[0] == set(['light'])
+        ucs, astar = countcalls(successors), countcalls(successors)
+        t_ucs, path1 = timedcall(lowest_cost_search, start, ucs, is_goal, action_cost)
+        t_astar, path2 = timedcall(astar_search, start, astar, is_goal, action_cost,
+                                   bridge_heuristic)
+        assert path_cost(path1) == path_cost(path2)
+        print("%3d %8d %8d %9.4fs %9.4fs" % (n, ucs.calls, astar.calls, t_ucs, t_astar))
+
+#compare_expansions()
@@ -1,3 +1,7 @@
+import os, tempfile
+from collections import deque
+from search_cache import disk_memo
+
 def csuccessors(state):
     """Find successors (including those that result in dining) to this
     state. But a state where the cannibals can dine has no successors.
@@ -66,6 +70,71 @@ def mc_problem(start=(3, 3, 1, 0, 0, 0), goal=None):
 
 Fail = []
 
+def mc_general(M, C, K=2):
+    """Solve missionaries and cannibals for M missionaries, C cannibals and a
+    boat that holds K people. Nobody may be outnumbered by cannibals on
+    either bank or in the boat (unless there are no missionaries there).
+    Return a path in the form of mc_problem, with actions such as 'MMC->'.
+
+    Only the start side is needed to know a state, so a state is packed
+    into one int, (M1 * (C+1) + C1) * 2 + B1, and the explored states are
+    a list indexed by these ints. The boat loads are worked out once."""
+    n = (M + 1) * (C + 1) * 2
+    loads = [(m, c, (m * (C + 1) + c) * 2, 'M' * m + 'C' * c)
+             for m in range(K + 1) for c in range(K + 1 - m)
+             if 0 < m + c and (m == 0 or m >= c)]
+    def safe(m1, c1):
+        m2, c2 = M - m1, C - c1
+        return not (outnumbered(m1, c1) or outnumbered(m2, c2))
+    start, goal = n - 1, 0      # everyone on the start side; everyone across
+    parents = [None] * n        # parents[state] = (previous_state, load index)
+    parents[start] = start
+    frontier = deque([start])
+    while frontier and parents[goal] is None:
+        s = frontier.popleft()
+        b = s & 1
+        m1, c1 = divmod(s >> 1, C + 1)
+        for i, (m, c, delta, _) in enumerate(loads):
+            if b:
+                if m > m1 or c > c1 or not safe(m1 - m, c1 - c):
+                    continue
+                state = s - delta - 1
+            else:
+                if m > M - m1 or c > C - c1 or not safe(m1 + m, c1 + c):
+                    continue
+                state = s + delta + 1
+            if parents[state] is None:
+                parents[state] = (s, i)
+                frontier.append(state)
+    if parents[goal] is None:
+        return Fail
+    path, state = [], goal
+    while state != start:
+        previous, i = parents[state]
+        arrow = previous & 1
+        path += [unpack_mc(state, M, C), loads[i][3] + '->' if arrow else '<-' + loads[i][3]]
+        state = previous
+    path.append(unpack_mc(start, M, C))
+    path.reverse()
+    return path
+
+def outnumbered(m, c):
+    "Do c cannibals outnumber m missionaries (with some missionaries there)?"
+    return c > m > 0
+
+def unpack_mc(state, M, C):
+    "The (M1, C1, B1, M2, C2, B2) tuple of a packed state of mc_general."
+    b = state & 1
+    m1, c1 = divmod(state >> 1, C + 1)
+    return (m1, c1, b, M - m1, C - c1, 1 - b)
+
+# Solutions on disk, saved by disk_memo (see search_cache.py).
+
+@disk_memo(key=lambda start=(3, 3, 1, 0, 0, 0), goal=None: (tuple(start), goal))
+def cached_mc_problem(start=(3, 3, 1, 0, 0, 0), goal=None):
+    "mc_problem, with the solutions kept on disk."
+    return mc_problem(start, goal)
+
 def test():
     assert csuccessors((2, 2, 1, 0, 0, 0)) == {(2, 1, 0, 0, 1, 1): 'C->', 
                                                (1, 2, 0, 1, 0, 1): 'M->', 
@@ -78,6 +147,24 @@ def test():
                                                (1, 3, 1, 4, 1, 0): '<-CC', 
                                                (2, 2, 1, 3, 2, 0): '<-MC'}
     assert csuccessors((1, 4, 1, 2, 2, 0)) == {}
+    path = mc_general(3, 3)
+    assert len(path) == len(mc_problem()) == 23
+    assert all(csuccessors(path[i])[path[i+2]] == path[i+1]
+               for i in range(0, len(path) - 2, 2))
+    assert mc_general(4, 4) == mc_general(6, 6, 3) == Fail
+    assert len(mc_general(5, 5, 3)) // 2 == 11
+    assert len(mc_general(2, 5, 2)) // 2 == len(mc_problem((2, 5, 1, 0, 0, 0))) // 2
+    assert mc_general(300, 300, 4)[-1] == (0, 0, 0, 300, 300, 1)
+    with tempfile.TemporaryDirectory() as folder:
+        cached = disk_memo(None, (csuccessors,), folder)(mc_problem)
+        assert cached() == cached() == mc_problem()
+        assert cached((2, 2, 1, 0, 0, 0)) == mc_problem((2, 2, 1, 0, 0, 0))
+        assert len(os.listdir(folder)) == 2
+        keywords = disk_memo(lambda start=(3, 3, 1, 0, 0, 0), goal=None: (tuple(start), goal),
+                             (csuccessors,), folder)(mc_problem)
+        assert keywords(goal=(0, 0, 0, 3, 3, 1)) == mc_problem()
+        assert keywords(goal=(0, 0, 0, 3, 3, 1)) == mc_problem()
+        assert len(os.listdir(folder)) == 3
     return 'tests pass'
 
 print(test())
\ No newline at end of file
@@ -17,9 +17,13 @@
 # ('empty', i), ('pour', i, j) where i and j are indices indicating the 
 # glass number. 
 
-import itertools
+import functools, heapq, itertools, math, multiprocessing, os, struct
+import tempfile, time, tracemalloc
+from collections import deque
+from search_cache import code_version, disk_memo
 
-def more_pour_problem(capacities, goal, start=None):
+def more_pour_problem(capacities, goal, start=None, search=None, canonical=False,
+                      lazy=False):
     """The first argument is a tuple of capacities (numbers) of glasses; the
     goal is a number which we must achieve in some glass.  start is a tuple
     of starting levels for each glass; if None, that means 0 for all.
@@ -27,7 +31,12 @@ def more_pour_problem(capacities, goal, start=None):
     Keep track of frontier and previously explored; fail when no frontier.
     On success return a path: a [state, action, state2, ...] list, where an
     action is one of ('fill', i), ('empty', i), ('pour', i, j), where
-    i and j are indices indicating the glass number."""
+    i and j are indices indicating the glass number.
+    search defaults to shortest_path_search. With canonical=True, glasses
+    of equal capacity are treated as interchangeable by the search (which
+    is given canonical= as a keyword argument). With lazy=True, successors
+    is a generator of (state, action) pairs, so the search can stop as soon
+    as one of them is a goal."""
     
     if start == None:
         start = (0,) * len(capacities)      # (0,0,0,...)
@@ -45,7 +54,6 @@ def more_pour_problem(capacities, goal, start=None):
                 val = 0 if act == "empty" else capacities[idx]                
                 ret[replace(state, idx, val)] = (act, idx)
         
-        perm = tuple(itertools.permutations(range(len(capacities)),2))
         for _act in perm:
             act = ("pour",) + _act
             delta = min((capacities[_act[1]] - state[_act[1]]), state[_act[0]])
@@ -55,9 +63,45 @@ def more_pour_problem(capacities, goal, start=None):
         
         return ret
     
+    perm = tuple(itertools.permutations(range(len(capacities)),2))
+    moves = pour_moves(capacities)
+
+    def lazy_successors(state):
+        "Generate the (state, action) pairs that change state, one at a time."
+        for (action, i, j, level) in moves:
+            if j is None:
+                if state[i] != level:
+                    yield replace(state, i, level), action
+            else:
+                delta = min(level - state[j], state[i])
+                if delta:
+                    s = list(state)
+                    s[i] -= delta
+                    s[j] += delta
+                    yield tuple(s), action
+
     is_goal = lambda state: goal in state
-        
-    return shortest_path_search(start, successors, is_goal)
+    
+    search = search or shortest_path_search
+    successors = lazy_successors if lazy else successors
+    if canonical:
+        return search(start, successors, is_goal, canonical=pour_canonical(capacities))
+    return search(start, successors, is_goal)
+
+def pour_moves(capacities):
+    """The table of moves for glasses with the given capacities: a list of
+    (action, i, j, level) tuples, where level is what glass i is set to by
+    fill and empty (j is None), or the capacity of glass j for a pour."""
+    n = len(capacities)
+    return ([(('empty', i), i, None, 0) for i in range(n)] +
+            [(('fill', i), i, None, capacities[i]) for i in range(n)] +
+            [(('pour', i, j), i, j, capacities[j])
+             for (i, j) in itertools.permutations(range(n), 2)])
+
+def successor_pairs(succ):
+    """The (state, action) pairs of what successors returned: either a
+    {state:action} dict or an iterable of pairs, such as a generator."""
+    return succ.items() if isinstance(succ, dict) else succ
 
 def replace(sequence, i, val):
     "Return copy of sequence, with sequence[i] replaced by val"
@@ -65,9 +109,108 @@ def replace(sequence, i, val):
     s[i] = val
     return type(sequence)(s)
     
-def shortest_path_search(start, successors, is_goal):
+def shortest_path_search(start, successors, is_goal, *, canonical=None):
     """Find the shortest path from start state to a state
-    such that is_goal(state) is true."""
+    such that is_goal(state) is true. If canonical is given, states
+    with the same canonical(state) count as the same state when we check
+    if we have already been there; the path still has the real states."""
+    if is_goal(start):
+        return [start]
+    key = canonical or (lambda state: state)
+    # Instead of a whole path, the frontier only holds states. The path to a
+    # state is rebuilt from the parents dict once we reach the goal.
+    parents = {key(start): None}    # {key(state): previous_state}; also the explored set
+    frontier = deque([start])       # ordered list of states we have reached
+    while frontier:
+        s = frontier.popleft()
+        for (state, action) in successor_pairs(successors(s)):
+            k = key(state)
+            if k not in parents:
+                parents[k] = s
+                if is_goal(state):
+                    return build_path(parents, state, successors, key)
+                else:
+                    frontier.append(state)
+    return Fail
+
+def build_path(parents, state, successors, key=lambda state: state):
+    """Follow the parents dict back from state to the start; return the path.
+    Only the previous state is kept for each state (an action as well would
+    take a tuple per state), so each action is found again among the
+    successors of the previous state."""
+    path = [state]
+    while parents[key(state)] is not None:
+        previous = parents[key(state)]
+        path += [step_action(successors(previous), state), previous]
+        state = previous
+    path.reverse()
+    return path
+
+def step_action(succ, state):
+    "The action that leads to state in succ, a {state:action} dict or an iterable of pairs."
+    if isinstance(succ, dict):
+        return succ[state]
+    return next(action for (s, action) in succ if s == state)
+
+def pour_canonical(capacities):
+    """Return a canonical(state) function for pour problems: glasses with
+    the same capacity can be swapped, so sort the levels of each group of
+    glasses with equal capacities."""
+    groups = [[i for i, c in enumerate(capacities) if c == capacity]
+              for capacity in sorted(set(capacities))]
+    groups = [g for g in groups if len(g) > 1]
+    if not groups:
+        return lambda state: state
+    def canonical(state):
+        levels = list(state)
+        for g in groups:
+            for i, level in zip(g, sorted(state[i] for i in g)):
+                levels[i] = level
+        return tuple(levels)
+    return canonical
+
+def pour_table(capacities, start=None):
+    """Solve the pour problem for every goal from 1 to the largest capacity
+    with one breadth first search. Return a table {goal: path}, with the
+    same path more_pour_problem would find for each reachable goal, and a
+    proof instead of a path for each unreachable one: a string saying that
+    every level is a multiple of the gcd of the capacities and start levels,
+    which goal is not, or failing that, that the search went through every
+    reachable state. The search stops once every goal that the gcd allows
+    has been found."""
+    top = max(capacities)
+    levels = tuple(capacities) + tuple(start or ())
+    g = functools.reduce(math.gcd, levels)
+    table = {}
+    def sweep(start, successors, is_goal):
+        wanted = set(range(g, top + 1, g))
+        parents = {start: None}     # {state: previous_state}
+        frontier = deque([start])
+        def found(state):
+            for level in wanted.intersection(state):
+                table[level] = build_path(parents, state, successors)
+                wanted.remove(level)
+        found(start)
+        while frontier and wanted:
+            s = frontier.popleft()
+            for (state, action) in successors(s).items():
+                if state not in parents:
+                    parents[state] = s
+                    frontier.append(state)
+                    found(state)
+        return len(parents)
+    n = more_pour_problem(capacities, None, start, sweep)
+    for goal in range(1, top + 1):
+        if goal % g:
+            table[goal] = ('every level is a multiple of gcd%s = %d, and %d is not'
+                           % (levels, g, goal))
+        elif goal not in table:
+            table[goal] = 'none of the %d reachable states has %d' % (n, goal)
+    return dict((goal, table[goal]) for goal in sorted(table))
+
+def shortest_path_search_slow(start, successors, is_goal):
+    """The original shortest_path_search, which stores a whole path for
+    every frontier entry. Kept as a reference for compare_memory()."""
     if is_goal(start):
         return [start]
     explored = set()
@@ -85,7 +228,260 @@ def shortest_path_search(start, successors, is_goal):
                     frontier.append(path2)
     return Fail
 
+def parallel_shortest_path_search(start, successors, is_goal, processes=None,
+                                  chunksize=512):
+    """Find the shortest path from start state to a state such that
+    is_goal(state) is true, like shortest_path_search, but one level of the
+    search at a time: the states of a level are split in chunks, successors
+    are computed by a pool of worker processes (None means one per cpu), and
+    the results are merged in order into the explored states before the
+    next level. Merging in order gives the same path as the serial search.
+    Worker processes get successors when they start (by fork), so it need
+    not be picklable where fork is the start method."""
+    if is_goal(start):
+        return [start]
+    parents = {start: None}     # {state: previous_state}
+    level = [start]
+    with multiprocessing.Pool(processes, init_worker, (successors,)) as pool:
+        while level:
+            chunks = [level[i:i+chunksize] for i in range(0, len(level), chunksize)]
+            if len(chunks) > 1:
+                results = pool.map(expand_chunk, chunks)
+            else:
+                results = [[successors(s) for s in level]]
+            level = []
+            for chunk, result in zip(chunks, results):
+                for s, succ in zip(chunk, result):
+                    for (state, action) in successor_pairs(succ):
+                        if state not in parents:
+                            parents[state] = s
+                            if is_goal(state):
+                                return build_path(parents, state, successors)
+                            level.append(state)
+    return Fail
+
+worker_successors = None
+
+def init_worker(successors):
+    global worker_successors
+    worker_successors = successors
+
+def expand_chunk(chunk):
+    "Return the successors of every state in chunk (as lists, so they can be pickled)."
+    return [list(successor_pairs(worker_successors(s))) for s in chunk]
+
+# External memory search. When even the explored set does not fit in memory,
+# every level of the breadth first search is written to a file of sorted,
+# fixed size records (state, parent_state, action_number), where states are
+# tuples of non-negative ints. A new level is built from sorted runs of
+# successors, merged and then compared with a sorted file of every state
+# seen before (or with the files of the last few levels) to drop the states
+# that are not new; the new level is then merged into that file. All of
+# this streams through the files, reading each of them once per level, and
+# only chunk_size records are held in memory at a time.
+
+def external_shortest_path_search(start, successors, is_goal, directory=None,
+                                  window=None, chunk_size=1 << 16):
+    """Find the shortest path from start state to a state such that
+    is_goal(state) is true, like shortest_path_search, but keep the levels
+    of the search on disk, in a temporary directory in directory (None
+    means the system default). New states are compared with the states of
+    the last window levels (None means all levels). If every action can
+    be undone, window=2 is enough; otherwise an unreachable goal may never
+    be given up with a window."""
+    if is_goal(start):
+        return [start]
+    n = len(start)
+    record = struct.Struct('>%dI%dIH' % (n, n))     # state, parent, action
+    key_size = struct.calcsize('>%dI' % n)          # bytes of the state
+    actions = {}                                    # {action: action_number}
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        levels = [os.path.join(tmp, 'level0')]
+        write_run(levels[0], [record.pack(*(start + start + (0,)))])
+        visited = os.path.join(tmp, 'visited')      # the states of all levels
+        write_run(visited, [record.pack(*(start + start + (0,)))[:key_size]])
+        while True:
+            runs, buffer = [], []
+            for rec in read_records(levels[-1], record.size, chunk_size):
+                s = record.unpack(rec)[:n]
+                for (state, action) in successor_pairs(successors(s)):
+                    number = actions.setdefault(action, len(actions))
+                    if is_goal(state):
+                        path = external_path(levels, s, record, key_size, actions)
+                        return path + [action, state]
+                    buffer.append(record.pack(*(state + s + (number,))))
+                    if len(buffer) >= chunk_size:
+                        runs.append(write_run('%s.run%d' % (levels[-1], len(runs)), buffer))
+                        buffer = []
+            if buffer:
+                runs.append(write_run('%s.run%d' % (levels[-1], len(runs)), buffer))
+            while len(runs) > 256:  # do not merge too many open files at once
+                groups = [runs[i:i+256] for i in range(0, len(runs), 256)]
+                runs = ['%s.merged%d' % (group[0], i) for i, group in enumerate(groups)]
+                for run, group in zip(runs, groups):
+                    merge_level(run, group, [], record.size, key_size, chunk_size)
+                    for old in group:
+                        os.remove(old)
+            level = os.path.join(tmp, 'level%d' % len(levels))
+            if window is None:
+                previous = [(visited, key_size)]
+            else:
+                previous = [(f, record.size) for f in levels[-window:]]
+            count = merge_level(level, runs, previous, record.size, key_size, chunk_size)
+            for run in runs:
+                os.remove(run)
+            if count == 0:
+                return Fail
+            levels.append(level)
+            if window is None:
+                merge_visited(visited, level, record.size, key_size, chunk_size)
+
+def write_run(filename, records):
+    "Sort the records and write them to filename; return filename."
+    records.sort()
+    with open(filename, 'wb') as f:
+        f.write(b''.join(records))
+    return filename
+
+def read_records(filename, size, chunk_size):
+    "Generate the records of the given size in filename, in order."
+    with open(filename, 'rb') as f:
+        while True:
+            data = f.read(size * chunk_size)
+            if not data:
+                return
+            for i in range(0, len(data), size):
+                yield data[i:i+size]
+
+def merge_level(filename, runs, previous, size, key_size, chunk_size):
+    """Merge the sorted runs into filename, keeping one record per state and
+    dropping states found in the sorted previous files, a list of
+    (filename, record_size). Return the number of records written."""
+    seen = [seen_before(f, rsize, key_size, chunk_size) for (f, rsize) in previous]
+    count, last = 0, None
+    with open(filename, 'wb') as out:
+        for rec in heapq.merge(*[read_records(run, size, chunk_size) for run in runs]):
+            key = rec[:key_size]
+            if key == last:
+                continue
+            last = key
+            if not any(found(key) for found in seen):
+                out.write(rec)
+                count += 1
+    return count
+
+def merge_visited(visited, level, size, key_size, chunk_size):
+    "Merge the states of the sorted level file into the sorted visited file."
+    merged = visited + '.new'
+    with open(merged, 'wb') as out:
+        for key in heapq.merge(read_records(visited, key_size, chunk_size),
+                               (rec[:key_size] for rec in read_records(level, size, chunk_size))):
+            out.write(key)
+    os.replace(merged, visited)
+
+def seen_before(filename, size, key_size, chunk_size):
+    """Return a function found(key) that says if a state is in the sorted
+    level file. Keys must be asked for in increasing order, so the file is
+    read just once."""
+    records = read_records(filename, size, chunk_size)
+    current = [next(records, None)]
+    def found(key):
+        while current[0] is not None and current[0][:key_size] < key:
+            current[0] = next(records, None)
+        return current[0] is not None and current[0][:key_size] == key
+    return found
+
+def external_path(levels, state, record, key_size, actions):
+    """Follow the parents back from state, which is in the last of the level
+    files, by binary search in each level file; return the path."""
+    names = dict((number, action) for (action, number) in actions.items())
+    n = len(state)
+    path = [state]
+    for level in reversed(levels[1:]):
+        fields = record.unpack(find_record(level, record.pack(*(state + state + (0,)))[:key_size],
+                                           record.size, key_size))
+        state, action = fields[n:2*n], names[fields[-1]]
+        path += [action, state]
+    path.reverse()
+    return path
+
+def find_record(filename, key, size, key_size):
+    "Binary search the sorted level file for the record with this key."
+    with open(filename, 'rb') as f:
+        lo, hi = 0, os.path.getsize(filename) // size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            f.seek(mid * size)
+            rec = f.read(size)
+            if rec[:key_size] < key:
+                lo = mid + 1
+            elif rec[:key_size] > key:
+                hi = mid
+            else:
+                return rec
+    raise KeyError(key)
+
+def iterative_deepening_search(start, successors, is_goal, max_depth=None,
+                               table_size=0):
+    """Find the shortest path from start state to a state such that
+    is_goal(state) is true, like shortest_path_search, but with depth first
+    searches of growing depth limit. That takes more time, but memory only
+    linear in the length of the path. table_size bounds an optional
+    transposition table of {state: depth} that prunes states we have already
+    reached with fewer actions (None means no bound). Without a table, an
+    unreachable goal is only given up at max_depth (None means never)."""
+    if is_goal(start):
+        return [start]
+    limit = 1
+    while max_depth is None or limit <= max_depth:
+        path, cutoff = depth_limited_search(start, successors, is_goal, limit, table_size)
+        if path or not cutoff:
+            return path
+        limit += 1
+    return Fail
+
+def depth_limited_search(start, successors, is_goal, limit, table_size):
+    """Depth first search for a goal state at most limit actions away from
+    start. Return (path, cutoff), where path is Fail if there is none and
+    cutoff is true if some states were not expanded because of the limit."""
+    path = [start]              # the path to the state we are expanding
+    on_path = set(path)         # states on path, so we do not go in circles
+    table = {start: 0}          # {state: fewest actions we reached it with}
+    stack = [iter(successor_pairs(successors(start)))]
+    cutoff = False
+    while stack:
+        depth = len(stack)      # the number of actions to reach a successor
+        for (state, action) in stack[-1]:
+            if state in on_path or table.get(state, depth + 1) <= depth:
+                continue
+            if is_goal(state):
+                return path + [action, state], cutoff
+            if depth == limit:
+                cutoff = True
+                continue
+            if table_size is None or len(table) < table_size or state in table:
+                table[state] = depth
+            path += [action, state]
+            on_path.add(state)
+            stack.append(iter(successor_pairs(successors(state))))
+            break
+        else:
+            stack.pop()
+            on_path.discard(path[-1])
+            del path[-2:]
+    return Fail, cutoff
+
 Fail = []
+
+# Solutions on disk, saved by disk_memo (see search_cache.py).
+
+@disk_memo(key=lambda capacities, goal, start=None: (
+               tuple(capacities), goal, tuple(start or (0,) * len(capacities))))
+def cached_pour_problem(capacities, goal, start=None):
+    """more_pour_problem with the default search, with the solutions kept on
+    disk. The glasses are numbered in the path, so their order is part of
+    the key."""
+    return more_pour_problem(capacities, goal, start)
     
 def test_more_pour():
     assert more_pour_problem((1, 2, 4, 8), 4) == [
@@ -96,6 +492,241 @@ def test_more_pour():
     assert not any(more_pour_problem(starbucks, odd) for odd in (3, 5, 7, 9))
     assert all(more_pour_problem((1, 3, 9, 27), n) for n in range(28))
     assert more_pour_problem((1, 3, 9, 27), 28) == []
+    with tempfile.TemporaryDirectory() as folder:
+        cached = disk_memo(lambda *args: args, (more_pour_problem,), folder)(more_pour_problem)
+        assert cached((1, 2, 4), 3) == cached((1, 2, 4), 3) == more_pour_problem((1, 2, 4), 3)
+        assert cached(starbucks, 3) == [] and len(os.listdir(folder)) == 2
+    # The version covers every function on the call path, such as successor_pairs.
+    version, saved = code_version(cached_pour_problem), successor_pairs
+    try:
+        globals()['successor_pairs'] = lambda succ: list(saved(succ))
+        assert code_version(cached_pour_problem) != version
+    finally:
+        globals()['successor_pairs'] = saved
+    assert code_version(cached_pour_problem) == version
     return 'test_more_pour passes'
 
-print(test_more_pour())
\ No newline at end of file
+def test_canonical():
+    canonical = pour_canonical((4, 9, 4, 9, 5))
+    assert canonical((3, 7, 1, 2, 5)) == (1, 2, 3, 7, 5)
+    assert pour_canonical((1, 2, 3))((1, 0, 3)) == (1, 0, 3)
+    for capacities, goal in [((4, 4, 9), 1), ((3, 3, 5, 5), 4), ((2, 6, 6, 9), 1),
+                             ((8, 12, 12), 3)]:
+        path = more_pour_problem(capacities, goal, canonical=True)
+        assert len(path) == len(more_pour_problem(capacities, goal))
+        assert path == [] or goal in path[-1]
+    return 'test_canonical passes'
+
+def test_lazy():
+    successors = lambda state: iter([(state + 1, '+'), (state - 1, '-')])
+    assert shortest_path_search(0, successors, lambda x: x == 2) == [0, '+', 1, '+', 2]
+    ids = lambda start, successors, is_goal: iterative_deepening_search(
+        start, successors, is_goal, 12, None)
+    for capacities, goal in [((1, 2, 4, 8), 4), ((1, 2, 4), 3), ((9, 4), 6),
+                             ((23, 29, 31), 28), ((8, 12, 16), 3)]:
+        # A search that just returns successors gives us the dict version.
+        successors = more_pour_problem(capacities, goal, None, lambda *args: args[1])
+        for search in (shortest_path_search, ids):
+            path = more_pour_problem(capacities, goal, None, search, lazy=True)
+            assert len(path) == len(more_pour_problem(capacities, goal, None, search))
+            assert all(successors(path[i])[path[i+2]] == path[i+1]
+                       for i in range(0, len(path) - 2, 2))
+    return 'test_lazy passes'
+
+def test_pour_table():
+    for capacities in [(1, 2, 4, 8), (9, 4), (23, 29, 31), (8, 12, 16), (6, 10, 15)]:
+        table = pour_table(capacities)
+        assert sorted(table) == list(range(1, max(capacities) + 1))
+        for goal, path in table.items():
+            assert path == (more_pour_problem(capacities, goal) or path)
+            assert isinstance(path, str) == (more_pour_problem(capacities, goal) == [])
+    assert pour_table((8, 12, 16))[6] == (
+        'every level is a multiple of gcd(8, 12, 16) = 4, and 6 is not')
+    assert pour_table((4, 6), (1, 0))[3] == more_pour_problem((4, 6), 3, (1, 0))
+    return 'test_pour_table passes'
+
+def test_iterative_deepening():
+    problems = [((1, 2, 4, 8), 4), ((1, 2, 4), 3), ((3, 7, 13), 11), ((1, 3, 9, 27), 22)]
+    for table_size in (0, 100, None):
+        search = lambda start, successors, is_goal: iterative_deepening_search(
+            start, successors, is_goal, 12, table_size)
+        for capacities, goal in problems + ([((9, 4), 6)] if table_size else []):
+            path = more_pour_problem(capacities, goal, None, search)
+            assert len(path) == len(more_pour_problem(capacities, goal))
+            assert goal in path[-1]
+    # With an unbounded table, an unreachable goal is given up on its own.
+    search = lambda start, successors, is_goal: iterative_deepening_search(
+        start, successors, is_goal, None, None)
+    assert more_pour_problem((8, 12, 16), 3, None, search) == []
+    return 'test_iterative_deepening passes'
+
+def test_parallel():
+    search = lambda start, successors, is_goal: parallel_shortest_path_search(
+        start, successors, is_goal, 2, 16)
+    for capacities, goal in [((1, 2, 4, 8), 4), ((3, 7, 13), 11), ((23, 29, 31), 28),
+                             ((8, 12, 16), 3)]:
+        assert (more_pour_problem(capacities, goal, None, search) ==
+                more_pour_problem(capacities, goal))
+    return 'test_parallel passes'
+
+def test_external():
+    for window in (None, 2):
+        search = lambda start, successors, is_goal: external_shortest_path_search(
+            start, successors, is_goal, None, window, 7)
+        for capacities, goal in [((1, 2, 4, 8), 4), ((1, 2, 4), 3), ((9, 4), 6),
+                                 ((23, 29, 31), 28), ((13, 17, 19, 23), 18)]:
+            path = more_pour_problem(capacities, goal, None, search)
+            assert len(path) == len(more_pour_problem(capacities, goal))
+            assert goal in path[-1] and path[0] == (0,) * len(capacities)
+    search = lambda start, successors, is_goal: external_shortest_path_search(
+        start, successors, is_goal)
+    assert more_pour_problem((8, 12, 16), 3, None, search) == []
+    # A deep search (398 levels) keeps only a few files open at a time.
+    try:
+        import resource
+        limits = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (64, limits[1]))
+    except (ImportError, ValueError, OSError):
+        limits = None
+    try:
+        path = more_pour_problem((201, 200), 100, None, search)
+    finally:
+        if limits:
+            resource.setrlimit(resource.RLIMIT_NOFILE, limits)
+    assert len(path) == len(more_pour_problem((201, 200), 100)) == 2 * 398 + 1
+    return 'test_external passes'
+
+print(test_more_pour())
+print(test_canonical())
+print(test_lazy())
+print(test_pour_table())
+print(test_iterative_deepening())
+print(test_external())
+if __name__ == '__main__':
+    print(test_parallel())
+
+def peak_memory(fn, *args):
+    "Call function with args; return the peak memory in bytes and result."
+    tracemalloc.start()
+    result = fn(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak, result
+
+def compare_memory(problems=(((23, 29, 31), 28), ((31, 37, 41), 38),
+                             ((13, 17, 19, 23), 22), ((13, 17, 19, 23), 18),
+                             ((201, 200), 100), ((1201, 1200), 600),
+                             ((4, 301, 300), 150))):
+    """Compare the peak memory of shortest_path_search (parent pointers)
+    with shortest_path_search_slow (whole paths on the frontier). Two
+    glasses whose capacities differ by 1 take hundreds or thousands of
+    steps to leave half of the larger one."""
+    print("%-26s %5s %12s %12s" % ("capacities, goal", "steps", "paths", "parents"))
+    for capacities, goal in problems:
+        m_slow, path1 = peak_memory(more_pour_problem, capacities, goal, None,
+                                    shortest_path_search_slow)
+        m_fast, path2 = peak_memory(more_pour_problem, capacities, goal, None,
+                                    shortest_path_search)
+        assert path1 == path2
+        print("%-26s %5d %11dK %11dK" % ((capacities, goal), len(path1) // 2,
+                                         m_slow // 1024, m_fast // 1024))
+
+#compare_memory()
+
+def parallel_speedup(capacities=(5, 7, 11, 13, 17), goal=18, cores=None):
+    """Time more_pour_problem with the serial search and with the parallel
+    search on 1, 2, 4, ... processes; print the speedup for each. (The
+    default goal is larger than any glass, so every state is explored.)"""
+    cores = cores or [n for n in (1, 2, 4, 8, 16, 32) if n <= os.cpu_count()]
+    t0 = time.perf_counter()
+    serial = more_pour_problem(capacities, goal)
+    t_serial = time.perf_counter() - t0
+    print("%5s %9s %8s" % ("cores", "time", "speedup"))
+    print("%5s %8.3fs %7.2fx" % ("-", t_serial, 1.0))
+    for n in cores:
+        search = lambda start, successors, is_goal: parallel_shortest_path_search(
+            start, successors, is_goal, n)
+        t0 = time.perf_counter()
+        path = more_pour_problem(capacities, goal, None, search)
+        t = time.perf_counter() - t0
+        assert len(path) == len(serial)
+        print("%5d %8.3fs %7.2fx" % (n, t, t_serial / t))
+
+#if __name__ == '__main__': parallel_speedup()
+
+def count_states(capacities, goal, canonical=False):
+    "The number of states more_pour_problem explores (is_goal is called once for each)."
+    calls = [0]
+    def search(start, successors, is_goal, **kwargs):
+        def counted_goal(state):
+            calls[0] += 1
+            return is_goal(state)
+        return shortest_path_search(start, successors, counted_goal, **kwargs)
+    more_pour_problem(capacities, goal, None, search, canonical)
+    return calls[0]
+
+def symmetry_reduction(problems=(((4, 4, 9), 10), ((3, 3, 5, 5), 6),
+                                 ((5, 5, 5, 7, 7), 8), ((6, 6, 6, 6, 11), 12))):
+    "Print the number of states explored without and with pour_canonical."
+    print("%-22s %8s %10s" % ("capacities", "states", "canonical"))
+    for capacities, goal in problems:
+        print("%-22s %8d %10d" % (capacities, count_states(capacities, goal),
+                                  count_states(capacities, goal, True)))
+
+#symmetry_reduction()
+
+def compare_successors(problems=(((23, 29, 31), 28), ((13, 17, 19, 23), 18),
+                                 ((5, 7, 11, 13, 17), 3), ((5, 7, 11, 13, 17), 30))):
+    """Compare the dict successors of more_pour_problem, which build every
+    successor state, and a dict for them, on every call, with the lazy
+    generator, which skips moves that change nothing and stops at the first
+    goal: print the bytes allocated for the successors of the states each
+    search expands (the peak of each call, measured with tracemalloc the
+    same way for both) and the time for each."""
+    print("%-28s %10s %10s %9s %9s" % ("capacities, goal", "dict", "lazy",
+                                      "dict", "lazy"))
+    for capacities, goal in problems:
+        built, times = [], []
+        for lazy in (False, True):
+            expanded, used = [], []
+            def search(start, successors, is_goal):
+                def recorded(state):
+                    expanded.append(state)
+                    return successors(state)
+                used.append(successors)
+                return shortest_path_search(start, recorded, is_goal)
+            more_pour_problem(capacities, goal, None, search, lazy=lazy)
+            total = 0
+            tracemalloc.start()
+            for state in expanded:
+                before = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                list(successor_pairs(used[0](state)))
+                total += tracemalloc.get_traced_memory()[1] - before
+            tracemalloc.stop()
+            built.append(total)
+            t0 = time.perf_counter()
+            more_pour_problem(capacities, goal, lazy=lazy)
+            times.append(time.perf_counter() - t0)
+        print("%-28s %9dK %9dK %8.3fs %8.3fs" % ((capacities, goal), built[0] // 1000,
+                                                   built[1] // 1000, times[0], times[1]))
+
+#compare_successors()
+
+def compare_pour_table(problems=((13, 17, 19, 23), (5, 7, 11, 13, 17),
+                                   (8, 12, 16, 20, 24), (6, 9, 15, 21))):
+    """Time more_pour_problem for every goal from 1 to the largest capacity
+    against a single pour_table."""
+    print("%-20s %5s %10s %10s" % ("capacities", "goals", "searches", "table"))
+    for capacities in problems:
+        goals = range(1, max(capacities) + 1)
+        t0 = time.perf_counter()
+        paths = [more_pour_problem(capacities, goal) for goal in goals]
+        t_each = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        table = pour_table(capacities)
+        t_table = time.perf_counter() - t0
+        assert all(path == table[goal] or not path for goal, path in zip(goals, paths))
+        print("%-20s %5d %9.3fs %9.3fs" % (capacities, len(goals), t_each, t_table))
+
+#compare_pour_table()
@@ -7,8 +7,8 @@
 other = {1:0, 0:1}  # mapping from player to other player
 goal = 40
 
-from functools import update_wrapper
-import random
+from functools import partial, update_wrapper
+import itertools, math, mmap, multiprocessing, os, random, struct, tempfile
 
 def decorator(d):
     "Make function d a decorator: d wraps a function fn."
@@ -206,3 +206,779 @@ print(test())
 
 
 
+
+
+" BOTTOM-UP SOLVER WITH ARRAYS "
+# Pwin_utiltiy and win_diff_utility recurse from the start state and keep a
+# dict entry for every state. Instead we can fill arrays U[me, you, pending]
+# (the utility) and A[me, you, pending] (True where 'hold' is the best
+# action) from the end of the game backwards. Every action leads to a state
+# with a higher score total me + you, or with the same total and more
+# pending, so if we go through the totals from high to low and within a
+# total through pending from high to low, the states an action leads to
+# are always done already: one sweep gives the exact values, and no further
+# iterations are needed. For each (total, pending) all the values of me are
+# done at once. The arrays go up to goal + 5 in every direction, so that
+# all the states just past the goal are in them, with their final values.
+
+def pig_tables(goal=goal, utility='wins'):
+    """Return the arrays (U, A) for the given goal, where utility is 'wins'
+    (as Pwin_utiltiy) or 'diffs' (as win_diff_utility). The arrays are
+    kept in pig_tables.cache."""
+    key = (goal, utility)
+    if key not in pig_tables.cache:
+        pig_tables.cache[key] = solve_pig(goal, utility)
+    return pig_tables.cache[key]
+
+pig_tables.cache = {}
+
+def solve_pig(goal, utility):
+    import numpy as np
+    n = goal + 6
+    me, you, pending = np.ogrid[:n, :n, :n]
+    if utility == 'wins':
+        U = np.where(me + pending >= goal, 1.0, np.where(you >= goal, 0.0, np.nan))
+    else:
+        U = np.where((me + pending >= goal) | (you >= goal),
+                     (me + pending - you).astype(float), np.nan)
+    A = np.zeros((n, n, n), dtype=bool)
+    for total in range(2 * goal - 2, -1, -1):
+        for p in range(goal - 1, -1, -1):
+            # All the states (me, total - me, p) of the game still on.
+            m = np.arange(max(0, total - goal + 1), min(total, goal - 1 - p) + 1)
+            if not len(m):
+                continue
+            y = total - m
+            # The same sums as Q_pig, in the same order, so ties are ties.
+            roll = (1 - U[y, m + 1, 0] + (U[m, y, p + 2] + U[m, y, p + 3] + U[m, y, p + 4]
+                                          + U[m, y, p + 5] + U[m, y, p + 6])) / 6
+            if p:
+                hold = 1 - U[y, m + p, 0]
+                A[m, y, p] = hold > roll
+                U[m, y, p] = np.maximum(roll, hold)
+            else:
+                U[m, y, p] = roll
+    return U, A
+
+def table_action(state, utility):
+    """The best action in state by the table for utility; for states where
+    the game is already over, ask the memo versions."""
+    _, me, you, pending = state
+    if me + pending >= goal or you >= goal:
+        return (max_wins if utility == 'wins' else max_diffs)(state)
+    return 'hold' if pig_tables(goal, utility)[1][me, you, pending] else 'roll'
+
+def max_wins_table(state):
+    "max_wins, with the array solver."
+    return table_action(state, 'wins')
+
+def max_diffs_table(state):
+    "max_diffs, with the array solver."
+    return table_action(state, 'diffs')
+
+" POLICY FILES "
+# A policy file has the best action and the win probability of every state
+# (me, you, pending) of the game still on, for one goal, so that a player
+# can look them up without solving anything: a header (magic, version,
+# goal), then goal**3 bytes, 1 where 'hold' is best, then goal**3 float32
+# win probabilities, both in the order of the index (me * goal + you) *
+# goal + pending. The file is read through mmap, so it is loaded lazily
+# and shared by every process that uses it.
+
+policy_header = struct.Struct('<4sHH')
+policy_magic, policy_version = b'PIG!', 1
+
+def save_policy(filename, goal=goal):
+    """Solve pig for goal (with pig_tables) and write the policy file. The
+    file is written under another name and then renamed, so that readers
+    never see half of it."""
+    import numpy as np
+    U, A = pig_tables(goal, 'wins')
+    tmp = '%s.%d.tmp' % (filename, os.getpid())
+    with open(tmp, 'wb') as f:
+        f.write(policy_header.pack(policy_magic, policy_version, goal))
+        f.write(A[:goal, :goal, :goal].astype(np.uint8).tobytes())
+        f.write(np.nan_to_num(U[:goal, :goal, :goal]).astype('<f4').tobytes())
+    os.replace(tmp, filename)
+
+def policy_strategy(filename):
+    """Return a strategy that plays by the policy file. It also has the
+    attributes goal and pwin, a function from a state to its win
+    probability."""
+    with open(filename, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, goal = policy_header.unpack_from(data)
+    if (magic, version) != (policy_magic, policy_version):
+        raise ValueError('%s is not a version %d pig policy file' % (filename, policy_version))
+    start, n = policy_header.size, goal ** 3
+    if len(data) != start + 5 * n:
+        raise ValueError('%s is truncated' % filename)
+    def strategy(state):
+        _, me, you, pending = state
+        if me + pending >= goal or you >= goal:
+            return 'hold'
+        return 'hold' if data[start + (me * goal + you) * goal + pending] else 'roll'
+    def pwin(state):
+        _, me, you, pending = state
+        if me + pending >= goal:
+            return 1
+        elif you >= goal:
+            return 0
+        return struct.unpack_from('<f', data, start + n + 4 * ((me * goal + you) * goal + pending))[0]
+    strategy.goal, strategy.pwin = goal, pwin
+    return strategy
+
+def test_tables():
+    states = [(0, me, you, pending) for me in range(goal) for you in range(goal)
+              for pending in range(goal - me)]
+    assert all(max_wins_table(state) == max_wins(state) for state in states)
+    assert all(max_diffs_table(state) == max_diffs(state) for state in states)
+    U, A = pig_tables(goal, 'wins')
+    assert all(U[s[1:]] == Pwin_utiltiy(s) for s in states[::97])
+    assert max_wins_table((1, 40, 12, 0)) == max_wins((1, 40, 12, 0))
+    with tempfile.TemporaryDirectory() as folder:
+        filename = os.path.join(folder, 'pig40.policy')
+        save_policy(filename, goal)
+        strategy = policy_strategy(filename)
+        assert strategy.goal == goal
+        assert all(strategy(state) == max_wins_table(state) for state in states)
+        assert all(abs(strategy.pwin(s) - Pwin_utiltiy(s)) < 1e-6 for s in states[::97])
+        assert play_pig(strategy, bad_strategy).__name__ == 'strategy'
+        assert strategy((0, 3, goal, 0)) == strategy((0, goal - 1, goal + 5, 0)) == 'hold'
+        with open(filename, 'r+b') as f:
+            f.write(b'NOPE')
+        try:
+            policy_strategy(filename)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('a bad policy file was read')
+    return 'test_tables passes'
+
+def compare_solvers(goals=(40, 60, 100)):
+    """Time Pwin_utiltiy (from the start state, with an empty cache) and
+    pig_tables for each goal, and measure the peak memory of each."""
+    import sys, time, tracemalloc
+    global goal
+    saved_goal, saved_limit = goal, sys.getrecursionlimit()
+    sys.setrecursionlimit(100000)
+    print("%5s %10s %10s %10s %10s" % ("goal", "memo", "memory", "arrays", "memory"))
+    try:
+        for goal in goals:
+            results = []
+            for solve in (lambda: Pwin_utiltiy((0, 0, 0, 0)),
+                          lambda: solve_pig(goal, 'wins')):
+                Pwin_utiltiy.cache.clear()
+                t0 = time.perf_counter()
+                solve()
+                results.append(time.perf_counter() - t0)
+                Pwin_utiltiy.cache.clear()
+                tracemalloc.start()     # slows it down, so it is not timed
+                solve()
+                results.append(tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+            print("%5d %9.2fs %9dM %9.2fs %9dM" % (goal, results[0], results[1] // 2**20,
+                                                  results[2], results[3] // 2**20))
+    finally:
+        goal = saved_goal
+        Pwin_utiltiy.cache.clear()
+        sys.setrecursionlimit(saved_limit)
+
+#compare_solvers()
+
+" TOURNAMENTS "
+# play_pig takes its die rolls from one generator shared by every game, so
+# a series of games can neither be repeated nor split between processes. A
+# tournament plays n games for every pair of strategies in chunks, and each
+# chunk rolls with its own random.Random, seeded from the seed of the
+# tournament, the pair and the first game of the chunk. So the results
+# only depend on the seed: not on the number of processes, nor on which
+# of them plays a chunk. Within a chunk the players take turns going first.
+
+def clueless(state):
+    "A strategy that ignores the state and chooses at random from possible moves."
+    return random.choice(['roll', 'hold'])
+
+def hold_at(x):
+    """Return a strategy that holds if and only if
+    pending >= x or player reaches goal."""
+    def strategy(state):
+        (p, me, you, pending) = state
+        if pending >= x or pending + me >= goal: return "hold"
+        else: return "roll"
+    strategy.__name__ = 'hold_at(%d)' % x
+    return strategy
+
+def tournament(strategies, n=10000, seed=0, processes=None, chunksize=5000):
+    """Play n games for every pair of strategies. Return a list with a
+    tuple (A, B, wins, n, low, high) for every pair: A won wins of the n
+    games against B, and (low, high) is the 95% confidence interval of its
+    win rate. The chunks are played by a pool of worker processes (None
+    means one per cpu, 1 means no pool). Workers get the strategies when
+    they start (by fork), so they need not be picklable where fork is the
+    start method."""
+    pairs = list(itertools.combinations(range(len(strategies)), 2))
+    chunks = [(i, j, min(chunksize, n - first), '%s/%d/%d/%d' % (seed, i, j, first))
+              for (i, j) in pairs for first in range(0, n, chunksize)]
+    if processes == 1:
+        init_player(strategies)
+        results = list(map(play_chunk, chunks))
+    else:
+        with multiprocessing.Pool(processes, init_player, (strategies,)) as pool:
+            results = pool.map(play_chunk, chunks)
+    wins = dict.fromkeys(pairs, 0)
+    for (i, j, _, _), w in zip(chunks, results):
+        wins[i, j] += w
+    return [(strategies[i], strategies[j], wins[i, j], n) + wilson(wins[i, j], n)
+            for (i, j) in pairs]
+
+player_strategies = None
+
+def init_player(strategies):
+    global player_strategies
+    player_strategies = strategies
+
+def play_chunk(chunk):
+    """Play the games of one chunk; return how many the first strategy won.
+    Strategies that use the random module (like clueless) get it seeded
+    from the chunk's generator too, and its state is put back afterwards,
+    for the caller's sake when there is no pool."""
+    i, j, games, seed = chunk
+    A, B = player_strategies[i], player_strategies[j]
+    rng = random.Random(seed)
+    saved = random.getstate()
+    random.seed(rng.getrandbits(64))
+    try:
+        rolls = iter(partial(rng.randint, 1, 6), None)
+        wins = 0
+        for g in range(games):
+            winner = play_pig(B, A, rolls) if g % 2 else play_pig(A, B, rolls)
+            wins += winner is A
+    finally:
+        random.setstate(saved)
+    return wins
+
+def wilson(wins, games, z=1.96):
+    "The Wilson score interval (low, high) of a win rate; z=1.96 for 95%."
+    if not games:
+        return (0.0, 1.0)
+    p = wins / games
+    d = 1 + z * z / games
+    centre = (p + z * z / (2 * games)) / d
+    half = z * math.sqrt(p * (1 - p) / games + z * z / (4 * games * games)) / d
+    return (centre - half, centre + half)
+
+def print_tournament(results):
+    print("%-16s %-16s %8s %17s %9s" % ("A", "B", "A wins", "95% interval", "games"))
+    for (A, B, wins, games, low, high) in results:
+        print("%-16s %-16s %8.4f  [%.4f, %.4f] %9d" % (A.__name__, B.__name__, wins / games,
+                                                     low, high, games))
+
+def test_tournament():
+    players = [hold_at(20), hold_at(10), clueless, max_wins_table]
+    state = random.getstate()
+    results = tournament(players, 600, seed=1, processes=1, chunksize=200)
+    assert random.getstate() == state
+    assert results == tournament(players, 600, seed=1, processes=1, chunksize=200)
+    assert results != tournament(players, 600, seed=2, processes=1, chunksize=200)
+    assert len(results) == 6
+    rates = {}
+    for (A, B, wins, games, low, high) in results:
+        assert games == 600 and 0 <= low <= wins / games <= high <= 1
+        rates[A.__name__, B.__name__] = (low, high)
+    assert rates['hold_at(20)', 'clueless'][0] > 0.5
+    assert rates['clueless', 'max_wins_table'][1] < 0.5
+    assert wilson(0, 0) == (0.0, 1.0)
+    low, high = wilson(500, 1000)
+    assert abs(low + high - 1) < 1e-12 and 0.46 < low < 0.47
+    return 'test_tournament passes'
+
+def test_parallel_tournament():
+    players = [hold_at(20), hold_at(10), clueless, max_wins_table]
+    assert (tournament(players, 600, seed=1, processes=2, chunksize=200) ==
+            tournament(players, 600, seed=1, processes=1, chunksize=200))
+    return 'test_parallel_tournament passes'
+
+def tournament_speed(n=100000):
+    "Time a tournament of a few threshold strategies and the table strategies."
+    import time
+    players = [hold_at(15), hold_at(20), hold_at(25), max_wins_table, max_diffs_table]
+    t0 = time.perf_counter()
+    results = tournament(players, n)
+    seconds = time.perf_counter() - t0
+    print_tournament(results)
+    print("%d games in %.1fs: %.2f million games per minute"
+          % (n * len(results), seconds, n * len(results) / seconds * 60 / 1e6))
+
+#tournament_speed()
+
+" BATCH SIMULATION WITH ARRAYS "
+# For strategies that only look at (me, you, pending), such as hold_at(x)
+# or the table strategies, the calls of play_pig are the cost of a game. A
+# strategy can be compiled to a hold table instead, an array of bools
+# indexed [me, you, pending] over the states of the game still on, as in a
+# policy file, and then many games can be played at once: each step of
+# simulate moves every game that is not over yet by one action, with one
+# die roll for each. A player whose pending points reach the goal holds
+# (and wins), as hold_at and the optimal strategies do, so the table does
+# not need those states.
+
+def strategy_table(strategy, goal=goal):
+    "The hold table of strategy, by calling it once for every state of the game still on."
+    import numpy as np
+    table = np.zeros((goal, goal, goal), dtype=bool)
+    for me in range(goal):
+        for you in range(goal):
+            for pending in range(goal - me):
+                table[me, you, pending] = strategy((0, me, you, pending)) == 'hold'
+    return table
+
+def simulate(A, B, n=100000, seed=0):
+    """Play n games between the hold tables A and B (for the same goal),
+    A first in the even games and B in the odd ones, with the die rolls of
+    numpy.random.default_rng(seed). Return the number of games A won."""
+    import numpy as np
+    goal = len(A)
+    rng = np.random.default_rng(seed)
+    tables = np.stack([A, B])
+    turn = np.arange(n) % 2                # the table of the player to move
+    me, you, pending = (np.zeros(n, dtype=np.int64) for _ in range(3))
+    wins = 0
+    while len(turn):
+        score = me + pending
+        holds = (score >= goal) | tables[turn, me, you, np.minimum(pending, goal - 1)]
+        die = rng.integers(1, 7, size=len(turn))
+        rolls = ~holds & (die > 1)
+        pending += np.where(rolls, die, 0)
+        # A hold banks the pending points, a pig out scores 1; either way
+        # the turn passes, and the player who moved may have won.
+        done = ~rolls
+        banked = np.where(holds, score, me + 1)
+        me[done], you[done] = you[done], banked[done]
+        pending[done] = 0
+        turn[done] ^= 1
+        over = done & (you >= goal)
+        wins += np.count_nonzero(turn[over] == 1)     # the winner is the one before, A
+        keep = ~over
+        turn, me, you, pending = turn[keep], me[keep], you[keep], pending[keep]
+    return wins
+
+def test_simulate():
+    import numpy as np
+    A, B = strategy_table(hold_at(20)), strategy_table(hold_at(25))
+    assert A.shape == (goal, goal, goal) and A[0, 0, 20] and not A[0, 0, 19]
+    assert simulate(A, B, 1000, seed=3) == simulate(A, B, 1000, seed=3)
+    never = np.zeros_like(A)
+    assert simulate(never, never, 2, seed=0) == 1     # the first player always wins
+    assert simulate(A, A, 1) in (0, 1)
+    # Against play_pig in a tournament: the win rates agree within the
+    # error of the two samples.
+    n = 20000
+    rate = simulate(A, B, n, seed=1) / n
+    _, _, wins, games, low, high = tournament([hold_at(20), hold_at(25)], n, 1, 1)[0]
+    assert abs(rate - wins / games) < 4 * math.sqrt(2 * rate * (1 - rate) / n)
+    best = pig_tables(goal, 'wins')[1][:goal, :goal, :goal]
+    assert simulate(best, A, n, seed=2) > n / 2
+    return 'test_simulate passes'
+
+def compare_simulators(n=100000):
+    "Time hold_at(20) against hold_at(25) with tournament (on one process) and with simulate."
+    import time
+    t0 = time.perf_counter()
+    _, _, wins, _, _, _ = tournament([hold_at(20), hold_at(25)], n, processes=1)[0]
+    t1 = time.perf_counter()
+    simulated = simulate(strategy_table(hold_at(20)), strategy_table(hold_at(25)), n)
+    t2 = time.perf_counter()
+    print("play_pig: %.4f in %.2fs; simulate: %.4f in %.2fs (%.0fx)"
+          % (wins / n, t1 - t0, simulated / n, t2 - t1, (t1 - t0) / (t2 - t1)))
+
+#compare_simulators()
+
+" PIG VARIANTS "
+# Everything above is for this file's goal, a six-sided die and a pig out
+# that scores 1, and the memo caches of Pwin_utiltiy and win_diff_utility
+# do not know the goal: after a change of goal they give the old values.
+# The utility of a state only depends on the points each player still
+# needs, not on the goal, so a table U[a, b, k] (the player to move needs
+# a more points, the other b, and k are pending) solves every goal up to
+# its size, and a table for a larger goal can start with the one for a
+# smaller goal and only fill in the new states. need_table keeps one table
+# for each variant (die, pigout, utility), at most need_table.maxsize of
+# them; the one used least recently goes first.
+#
+# If a pig out scores 0, as in the usual rules, the game has cycles: both
+# players pig out and they are back where they were. The value of (a, b, 0)
+# then depends on that of (b, a, 0), its partner, which is computed in the
+# same sweep. So for each total a + b we guess the values at pending 0 and
+# sweep, keeping track of how each value depends on the guess for the
+# partner (D, the slope). With the actions of the sweep that dependence is
+# linear, and solving the pairs of linear equations gives the next guesses.
+# As in policy iteration, this is exact once the actions stop changing,
+# which takes a few sweeps.
+
+def pig_solver(goal=goal, die=6, pigout=1, utility='wins'):
+    """Return the optimal strategy for the pig with this goal, die (number
+    of sides) and pigout (the points for rolling a 1), with utility
+    'wins' or 'diffs' (as max_wins and max_diffs). The strategy has the
+    attribute U, the utility of a state, and the attributes of the variant."""
+    def U(state):
+        _, me, you, pending = state
+        a, b = goal - me, goal - you
+        if pending >= a or b <= 0:
+            if utility == 'wins':
+                return 1 if pending >= a else 0
+            return b - a + pending
+        return need_table(goal, die, pigout, utility)[0][a + pigout, b + pigout, pending]
+    def strategy(state):
+        _, me, you, pending = state
+        if me + pending >= goal or you >= goal:
+            return 'hold'
+        A = need_table(goal, die, pigout, utility)[1]
+        return 'hold' if A[goal - me + pigout, goal - you + pigout, pending] else 'roll'
+    strategy.__name__ = 'pig_solver(%d, %d, %d, %r)' % (goal, die, pigout, utility)
+    strategy.U, strategy.goal, strategy.die, strategy.pigout = U, goal, die, pigout
+    return strategy
+
+def need_table(goal, die=6, pigout=1, utility='wins'):
+    """Return the arrays (U, A) of the variant for needs up to goal at
+    least, both indexed [pigout + a, pigout + b, k] (a needs as low as
+    -pigout, for a player who wins with a pig out). A is True where 'hold'
+    is the best action."""
+    key = (die, pigout, utility)
+    cache = need_table.cache
+    tables = cache.pop(key, None)   # and put back, as the last one used
+    if tables is None or len(tables[0]) - pigout - 1 < goal:
+        tables = solve_needs(goal, die, pigout, utility, tables)
+    cache[key] = tables
+    while len(cache) > need_table.maxsize:
+        del cache[next(iter(cache))]
+    return tables
+
+need_table.cache = {}
+need_table.maxsize = 8
+
+def solve_needs(goal, die, pigout, utility, old=None):
+    """Solve the variant for needs up to goal, as solve_pig does. The states
+    of old, the arrays (U, A) for a smaller goal, are copied, not solved."""
+    import numpy as np
+    o = pigout
+    a, b, k = np.ogrid[-o:goal + 1, -o:goal + 1, :goal + die + 1]
+    if utility == 'wins':
+        U = np.where(k >= a, 1.0, np.where(b <= 0, 0.0, np.nan))
+    else:
+        U = np.where((k >= a) | (b <= 0), (b - a + k).astype(float), np.nan)
+    A = np.zeros(U.shape, dtype=bool)
+    D = np.zeros(U.shape) if not pigout else None
+    done = 0                        # the needs up to done are solved
+    if old is not None:
+        n, _, nk = old[0].shape
+        U[:n, :n, :nk], A[:n, :n, :nk] = old
+        done = n - o - 1
+    for total in range(2, 2 * goal + 1):
+        ms = np.arange(max(1, total - goal), min(goal, total - 1) + 1)
+        ms = ms[(ms > done) | (total - ms > done)]
+        if not len(ms):
+            continue
+        if not pigout:
+            U[ms + o, total - ms + o, 0] = 0.5
+        while True:
+            guess = U[ms + o, total - ms + o, 0]
+            for p in range(goal - 1, -1, -1):
+                m = ms[ms > p]
+                if not len(m):
+                    continue
+                y = total - m
+                rolls = U[m + o, y + o, p + 2]
+                for d in range(3, die + 1):
+                    rolls = rolls + U[m + o, y + o, p + d]
+                roll = (1 - U[y + o, m - pigout + o, 0] + rolls) / die
+                if p:
+                    hold = 1 - U[y + o, m - p + o, 0]
+                    A[m + o, y + o, p] = hold > roll
+                    U[m + o, y + o, p] = np.maximum(roll, hold)
+                else:
+                    U[m + o, y + o, p] = roll
+                if not pigout:
+                    slopes = D[m + o, y + o, p + 2]
+                    for d in range(3, die + 1):
+                        slopes = slopes + D[m + o, y + o, p + d]
+                    D[m + o, y + o, p] = np.where(A[m + o, y + o, p], 0.0, (slopes - 1) / die)
+            if pigout:
+                break
+            value, slope = U[ms + o, total - ms + o, 0], D[ms + o, total - ms + o, 0]
+            if np.allclose(value, guess, rtol=1e-13, atol=1e-13):
+                break
+            # value + slope * (partner - partner guess), for both of a pair;
+            # ms is symmetric, so the partners are ms reversed.
+            partner, partner_value, partner_slope = guess[::-1], value[::-1], slope[::-1]
+            U[ms + o, total - ms + o, 0] = ((value + slope * (partner_value - partner
+                                                               - partner_slope * guess))
+                                            / (1 - slope * partner_slope))
+    return U, A
+
+def test_variants():
+    import numpy as np
+    states = [(0, me, you, pending) for me in range(goal) for you in range(goal)
+              for pending in range(goal - me)]
+    wins, diffs = pig_solver(goal), pig_solver(goal, utility='diffs')
+    assert all(wins(state) == max_wins(state) for state in states)
+    assert all(diffs(state) == max_diffs(state) for state in states)
+    assert all(wins.U(s) == Pwin_utiltiy(s) for s in states[::97])
+    assert all(diffs.U(s) == win_diff_utility(s) for s in states[::97])
+    assert wins.U((0, 38, 20, 2)) == 1 and wins.U((0, 20, 40, 0)) == 0
+    assert wins((0, 0, 45, 0)) == diffs((0, 0, 40, 3)) == 'hold'
+    # A smaller goal is a part of the table for a larger one, and a larger
+    # one starts from it.
+    saved = need_table.cache
+    need_table.cache = {}
+    try:
+        assert pig_solver(20, 4, 2).U((0, 5, 7, 3)) == pig_solver(40, 4, 2).U((0, 25, 27, 3))
+        assert len(need_table.cache) == 1
+        extended = need_table(40, 4, 2)
+        fresh = solve_needs(40, 4, 2, 'wins')
+        assert all(np.array_equal(x, y, equal_nan=True) for x, y in zip(extended, fresh))
+        # The usual rules: a pig out scores nothing.
+        usual = pig_solver(20, 6, 0)
+        assert abs(usual.U((0, 0, 0, 0)) - 0.61556) < 1e-5
+        assert usual.U((0, 0, 19, 0)) < 0.5 < usual.U((0, 19, 0, 0))
+        assert usual((0, 10, 10, 25)) == 'hold' and usual((0, 10, 10, 0)) == 'roll'
+        # The cache is bounded.
+        maxsize, need_table.maxsize = need_table.maxsize, 2
+        try:
+            pig_solver(10, 3)((0, 0, 0, 1))
+            pig_solver(10, 5)((0, 0, 0, 1))
+            assert list(need_table.cache) == [(3, 1, 'wins'), (5, 1, 'wins')]
+        finally:
+            need_table.maxsize = maxsize
+    finally:
+        need_table.cache = saved
+    return 'test_variants passes'
+
+" EXACT WIN PROBABILITIES "
+# The chance that a strategy A beats a strategy B can be computed rather
+# than sampled. In a turn the player to move only decides for itself, so
+# the turn of a strategy that starts at (me, you) banks points with a
+# distribution that does not depend on the other strategy: 0 if it holds
+# at once, 1 for a pig out, or the pending points of a hold. turn_outcomes
+# computes those once per strategy and goal, with hold and roll; a player
+# whose pending points reach the goal holds, as in simulate. Then a pair
+# of strategies only needs the probabilities at the starts of turns, and
+# as every turn but an immediate hold banks at least a point, they can be
+# filled in from the highest total score down. If both players hold at
+# once the game never ends and neither wins.
+
+def turn_outcomes(strategy, keep=True):
+    """The array T[me, you, points] of the probabilities that a turn of
+    strategy starting at (me, you) banks points. The turns with the same
+    actions for every pending (which for hold_at are the turns with the
+    same me) are worked out once. The arrays are kept for the
+    turn_outcomes.maxsize strategies used last, unless keep is False."""
+    import numpy as np
+    key = (strategy, goal)
+    cache = turn_outcomes.cache
+    T = cache.pop(key, None) if keep else cache.get(key)   # put back below
+    if T is None:
+        T, done = np.zeros((goal, goal, goal + 6)), {}
+        for me in range(goal):
+            pendings = [0] + list(range(2, goal - me))
+            for you in range(goal):
+                actions = tuple(strategy((0, me, you, pending)) for pending in pendings)
+                if (me, actions) not in done:
+                    done[me, actions] = turn_distribution(me, you, pendings, actions)
+                for points, q in done[me, actions].items():
+                    T[me, you, points] = q
+    if keep:
+        cache[key] = T
+        while len(cache) > turn_outcomes.maxsize:
+            del cache[next(iter(cache))]
+    return T
+
+turn_outcomes.cache = {}    # {(strategy, goal): T}
+turn_outcomes.maxsize = 16
+
+def turn_distribution(me, you, pendings, actions):
+    "The outcomes {points: probability} of one turn that takes actions at pendings."
+    banked = {}     # {pending: {points: probability}}
+    for pending, action in reversed(list(zip(pendings, actions))):
+        state = (0, me, you, pending)
+        if action == 'hold':
+            banked[pending] = {hold(state)[2] - me: 1}
+            continue
+        dist = banked[pending] = {}
+        for d in (1, 2, 3, 4, 5, 6):
+            s = roll(state, d)
+            if s[0] != state[0]:                        # a pig out
+                ends = {s[2] - me: 1}
+            elif s[1] + s[3] >= goal:
+                ends = {hold(s)[2] - me: 1}
+            else:
+                ends = banked[s[3]]
+            for points, q in ends.items():
+                dist[points] = dist.get(points, 0) + q / 6
+    return banked[0]
+
+def pwin_between(A, B):
+    """The exact probability that strategy A beats B: a pair (when A goes
+    first, when B goes first)."""
+    VA, VB = start_values(turn_outcomes(A), turn_outcomes(B))
+    return VA[0, 0], VB[0, 0]
+
+def start_values(TA, TB):
+    """The arrays VA[me, you] and VB[me, you] of P(A wins) at the starts of
+    the turns of A, and of B, from their turn outcomes TA and TB. Scores
+    from the goal on are in the arrays too: there A has won (VB is 1), or
+    B has (VA is 0). TA and TB can also be stacks of turn outcomes (with
+    more axes in front, which broadcast), for many pairs at once."""
+    import numpy as np
+    shape = np.broadcast_shapes(TA.shape, TB.shape)[:-3] + (goal, 2 * goal + 6)
+    VA, VB = np.zeros(shape), np.zeros(shape)
+    VB[..., goal:] = 1
+    points = np.arange(1, goal + 6)
+    for total in range(2 * goal - 2, -1, -1):
+        me = np.arange(max(0, total - goal + 1), min(goal - 1, total) + 1)
+        you = total - me
+        scores = me[:, None] + points
+        VA[..., me, you] = (TA[..., me, you, 1:] * VB[..., you[:, None], scores]).sum(-1)
+        VB[..., me, you] = (TB[..., me, you, 1:] * VA[..., you[:, None], scores]).sum(-1)
+        # Holding at once leaves the total as it is: then the other player
+        # moves, unless it holds at once too (you is me reversed).
+        holdA, holdB = TA[..., me, you, 0] == 1, TB[..., me, you, 0] == 1
+        VA[..., me, you] = np.where(holdA, np.where(holdB[..., ::-1], 0, VB[..., you, me]),
+                                    VA[..., me, you])
+        VB[..., me, you] = np.where(holdB, np.where(holdA[..., ::-1], 0, VA[..., you, me]),
+                                    VB[..., me, you])
+    return VA, VB
+
+def hold_at_sweep(thresholds=range(1, goal + 1)):
+    """{(x, y): P(hold_at(x) beats hold_at(y) going first)} for every pair
+    of thresholds. One computation serves both orders of a pair, as games
+    between thresholds of at least 1 always end, and hold_at(x) plays all
+    the thresholds from x on at once. Their turn outcomes are not kept."""
+    import numpy as np
+    thresholds = list(thresholds)
+    T = np.array([turn_outcomes(hold_at(x), keep=False) for x in thresholds])
+    table = {}
+    for i, x in enumerate(thresholds):
+        VA, VB = start_values(T[i], T[i:])
+        for y, first, second in zip(thresholds[i:], VA[:, 0, 0], VB[:, 0, 0]):
+            table[x, y], table[y, x] = first, 1 - second
+    return table
+
+def test_pwin_between():
+    A, B = hold_at(20), hold_at(25)
+    first, second = pwin_between(A, B)
+    assert 0.5 < first < 0.6 and 0.4 < second < 0.5
+    assert abs(pwin_between(B, A)[1] - (1 - first)) < 1e-12
+    # Against the samples: simulate plays A first in half of the games.
+    n = 100000
+    rate = simulate(strategy_table(A), strategy_table(B), n, seed=4) / n
+    assert abs(rate - (first + second) / 2) < 4 * math.sqrt(rate * (1 - rate) / n)
+    # Against the optimal strategy, hold_at(20) wins less than it would
+    # against itself, and both players holding at once never finish.
+    assert abs(sum(pwin_between(max_wins, max_wins)) - 1) < 1e-12
+    assert pwin_between(max_wins, A)[0] > pwin_between(A, A)[0]
+    assert pwin_between(bad_strategy, bad_strategy) == (0, 0)
+    assert pwin_between(bad_strategy, A) == (0, 0)
+    assert all(abs(p - 1) < 1e-12 for p in pwin_between(A, bad_strategy))
+    kept = list(turn_outcomes.cache)
+    table = hold_at_sweep(range(15, 26))
+    assert list(turn_outcomes.cache) == kept
+    # The cache is bounded, and keeps the strategies used last.
+    maxsize, turn_outcomes.maxsize = turn_outcomes.maxsize, 2
+    try:
+        pwin_between(hold_at(10), hold_at(11))
+        turn_outcomes(A)
+        assert list(turn_outcomes.cache)[-1] == (A, goal) and len(turn_outcomes.cache) == 2
+    finally:
+        turn_outcomes.maxsize = maxsize
+    assert abs(table[20, 25] - first) < 1e-12 and abs(table[25, 20] - (1 - second)) < 1e-12
+    assert all(0 < table[x, y] < 1 for (x, y) in table) and len(table) == 11 * 11
+    return 'test_pwin_between passes'
+
+def sweep_speed():
+    "Time hold_at_sweep for all the thresholds, and print the best reply to some."
+    import time
+    t0 = time.perf_counter()
+    table = hold_at_sweep()
+    print("%d pairs in %.1fs" % (len(table), time.perf_counter() - t0))
+    for y in (10, 15, 20, 25, 30):
+        x = max(range(1, goal + 1), key=lambda x: table[x, y] - table[y, x])
+        print("against hold_at(%d) the best is hold_at(%d): %.4f first, %.4f second"
+              % (y, x, table[x, y], 1 - table[y, x]))
+
+#sweep_speed()
+
+" BEST RESPONSE TO A FIXED STRATEGY "
+# Pwin_utiltiy assumes that the opponent plays as well as it can. Against
+# a known strategy we can do better: the utility of a state is still the
+# probability that the player to move wins, and Q_pig still holds, but
+# only our moves are a choice (the best action); for the opponent's moves
+# Q_pig is taken of the action its strategy chooses. We move at p = 0,
+# the opponent at p = 1. Once solved, our decisions are compiled into a
+# hold table (as strategy_table makes), so a move is a lookup, and the
+# table can be given to simulate. The opponent should not look at p: it
+# is only the same as in play_pig when we go first.
+
+def best_response(opponent):
+    """Return the strategy that wins most often against the strategy
+    opponent. It has the attributes table, its hold table, and pwin, the
+    probability that we win from a state where we are to move."""
+    import numpy as np
+    @memo
+    def Pwin(state):
+        (p, me, you, pending) = state
+        if me + pending >= goal:
+            return 1
+        elif you >= goal:
+            return 0
+        elif p == 0:
+            return max(Q_pig(state, action, Pwin) for action in pig_actions(state))
+        else:
+            return Q_pig(state, opponent(state), Pwin)
+    table = np.zeros((goal, goal, goal), dtype=bool)
+    for me in range(goal):
+        for you in range(goal):
+            for pending in range(goal - me):
+                state = (0, me, you, pending)
+                table[me, you, pending] = best_action(state, pig_actions, Q_pig, Pwin) == 'hold'
+    def strategy(state):
+        _, me, you, pending = state
+        if me + pending >= goal:
+            return 'hold'
+        return 'hold' if table[me, you, pending] else 'roll'
+    strategy.__name__ = 'best_response(%s)' % opponent.__name__
+    strategy.table = table
+    strategy.pwin = lambda state: Pwin((0,) + tuple(state[1:]))
+    return strategy
+
+def test_best_response():
+    A = hold_at(20)
+    best = best_response(A)
+    assert best.__name__ == 'best_response(hold_at(20))'
+    # It is exact, and it beats hold_at(20) more often than max_wins does.
+    first, second = pwin_between(best, A)
+    assert abs(first - best.pwin((0, 0, 0, 0))) < 1e-12
+    assert first > pwin_between(max_wins, A)[0] and second > pwin_between(max_wins, A)[1]
+    assert best((0, 10, 30, 20)) == 'roll' and best((0, 39, 12, 1)) == 'hold'
+    # Against the optimal strategy nothing does better than optimal play.
+    assert abs(best_response(max_wins).pwin((0, 0, 0, 0)) - Pwin_utiltiy((0, 0, 0, 0))) < 1e-12
+    # Against a player that always holds, just roll on to the goal.
+    assert not best_response(bad_strategy).table.any()
+    return 'test_best_response passes'
+
+# The tests of the solvers and simulators take a while, so that importing
+# this file (for policy_strategy, say) does not: they run with the file.
+
+if __name__ == '__main__':
+    # python optimal_pig.py FILE [GOAL] writes the policy file for GOAL.
+    import sys
+    if len(sys.argv) > 1:
+        save_policy(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else goal)
+    else:
+        print(test_tables())
+        print(test_tournament())
+        print(test_parallel_tournament())
+        print(test_simulate())
+        print(test_variants())
+        print(test_pwin_between())
+        print(test_best_response())
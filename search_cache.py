@@ -0,0 +1,86 @@
+"""Solutions on disk, shared by the search problems here. They are pure
+functions of their parameters, so a solution can be saved once and used by
+every process. Nothing runs on import."""
+
+import hashlib, os, pickle, tempfile
+from functools import update_wrapper
+from types import FunctionType
+
+def disk_memo(key=None, depends=(), directory=None):
+    """Decorator that saves the result of each call to f in a file in
+    directory, one file per key(*args, **kwargs) (just the arguments if key
+    is None), where other processes find it too. key should map problems
+    with the same solution to the same value, with a repr that is the same
+    in every process. A saved result is only used if it was made by the same
+    code of f, of the functions of its module that it calls by name (see
+    code_version), and of the functions in depends, such as a successors
+    function that f is passed; otherwise it is stale and is replaced.
+    Results are pickles, and loading
+    a pickle runs code, so the default directory is ~/.cache/search_cache,
+    made readable by us only, and a directory that is not ours or that
+    others can write to is not used at all."""
+    def _d(f):
+        version = code_version(f, *depends)
+        folder = directory or os.path.join(os.path.expanduser('~'), '.cache', 'search_cache')
+        def _f(*args, **kwargs):
+            if key:
+                k = key(*args, **kwargs)
+            else:
+                k = args + tuple(sorted(kwargs.items())) if kwargs else args
+            if not private_folder(folder):
+                return f(*args, **kwargs)
+            name = hashlib.sha1(repr((f.__name__, k)).encode()).hexdigest()
+            filename = os.path.join(folder, name)
+            try:
+                with open(filename, 'rb') as file:
+                    saved_version, saved_key, result = pickle.load(file)
+                if (saved_version, saved_key) == (version, k):
+                    return result
+            except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+                pass
+            result = f(*args, **kwargs)
+            with tempfile.NamedTemporaryFile(dir=folder, delete=False) as file:
+                pickle.dump((version, k, result), file, pickle.HIGHEST_PROTOCOL)
+            os.replace(file.name, filename)     # readers never see a half written file
+            return result
+        return update_wrapper(_f, f)
+    return _d
+
+def private_folder(folder):
+    """Make folder (for us only) if it does not exist, and return True if
+    it is safe to load from: ours, and not writable by anyone else."""
+    try:
+        os.makedirs(folder, mode=0o700, exist_ok=True)
+        info = os.stat(folder)
+    except OSError:
+        return False
+    mine = info.st_uid == os.getuid() if hasattr(os, 'getuid') else True
+    return mine and not info.st_mode & 0o022
+
+def code_version(*fns):
+    """A hash of the byte code, constants and names of fns, of the functions
+    defined inside them, and of the functions of the same module that they
+    call by name (and so on); it changes when any of them is edited."""
+    h = hashlib.sha1()
+    seen = set()
+    def add(code, env, module):
+        h.update(code.co_code)
+        h.update(repr(code.co_names).encode())
+        for const in code.co_consts:
+            if hasattr(const, 'co_code'):
+                add(const, env, module)
+            elif isinstance(const, frozenset):  # its order varies between processes
+                h.update(repr(sorted(map(repr, const))).encode())
+            else:
+                h.update(repr(const).encode())
+        for name in code.co_names:
+            called = getattr(env.get(name), '__wrapped__', env.get(name))
+            if (isinstance(called, FunctionType) and called not in seen
+                    and called.__module__ == module):
+                seen.add(called)
+                add(called.__code__, called.__globals__, module)
+    for fn in fns:
+        fn = getattr(fn, '__wrapped__', fn)
+        seen.add(fn)
+        add(fn.__code__, fn.__globals__, fn.__module__)
+    return h.hexdigest()
@@ -3,35 +3,171 @@ inventory:
     paths       [state, action, state, ...]
     states      atomic
     actions     atomic
-    successors  function(state) -> {state:action}
+    successors  function(state) -> {state:action}, or an iterable of
+                (state, action) pairs, such as a generator
     start       atomic state
     goal        function(state) -> bool
 
 -> shortest_path_search(start, successors, goal) -> path
+-> shortest_path_search(start, successors, goal, stats=True) -> (path, stats)
+
+When different states are really the same (symmetries):
+    canonical   function(state) -> key shared by all equivalent states
+
+-> shortest_path_search(start, successors, goal, canonical=canonical) -> path
+
+When there is one concrete goal state and we know how to step backwards:
+    predecessors function(state) -> {previous_state:action}
+
+-> bidirectional_search(start, goal, successors, predecessors) -> path
 """
+import time
+from collections import deque
 
-def shortest_path_search(start, successors, is_goal):
+def shortest_path_search(start, successors, is_goal, stats=False, *, canonical=None):
     """Find the shortest path from start state to a state
-    such that is_goal(state) is true."""
+    such that is_goal(state) is true. With stats=True return a
+    (path, stats) tuple instead, where stats is a dict as made by
+    new_stats, filled in by the search. If canonical is given, states
+    with the same canonical(state) are explored only once."""
+    if stats:
+        stats = new_stats()
+        path = breadth_first_search(start, timed(successors, stats, 'successors_time'),
+                                    timed(is_goal, stats, 'is_goal_time'), stats,
+                                    canonical=canonical)
+        return path, stats
+    return breadth_first_search(start, successors, is_goal, None, canonical=canonical)
+
+def breadth_first_search(start, successors, is_goal, stats=None, *, canonical=None):
+    "The search of shortest_path_search; if stats is a dict, count in it."
     if is_goal(start):
         return start
-    
-    explored = set()        # set of states we have visited
-    frontier = [[start]]    # ordered list of paths we have blazed
-    
+    key = canonical or identity
+    # Instead of a whole path, the frontier only holds states. The path to a
+    # state is rebuilt from the parents dict once we reach the goal.
+    parents = {key(start): None}    # {key(state): (previous_state, action)}; also the explored set
+    frontier = deque([start])   # ordered list of states we have reached
     while frontier:
-        path = frontier.pop(0)  # remove the first element from the frontier for adding the next action and state
-        s = path[-1]
-        for(state, action) in successors(s).items():
-            if state not in explored:
-                explored.add(state)     # track every explored state
-                path2 = path + [action, state]  # add the next state with the action to this path
-                if is_goal(state):       # we reached the goal
-                    return path2
+        s = frontier.popleft()
+        succ = successors(s)
+        if stats is not None:
+            count_expansion(stats, succ, len(frontier) + 1, len(parents))
+            if not isinstance(succ, dict):
+                succ = counted(succ, stats)
+        for (state, action) in successor_pairs(succ):
+            k = key(state)
+            if k not in parents:
+                parents[k] = (s, action)
+                if is_goal(state):
+                    if stats is not None:
+                        stats['explored'] = len(parents)
+                    return build_path(parents, state, key)
                 else:
-                    frontier.append(path2)  # add this updated path to the frontier
+                    frontier.append(state)
+            elif stats is not None:
+                stats['duplicates'] += 1
+    return Fail
+
+def new_stats():
+    """A dict of search statistics: the number of states expanded, successors
+    generated and duplicate successors pruned, the peak number of states on
+    the frontier and explored, and the seconds spent in successors and
+    is_goal."""
+    return dict(expanded=0, generated=0, duplicates=0, frontier_peak=0,
+                explored=0, successors_time=0.0, is_goal_time=0.0)
+
+def count_expansion(stats, succ, frontier, explored):
+    """Count the expansion of a state with successors succ in stats. If succ
+    is not a dict, its pairs are counted as they are generated; see counted."""
+    stats['expanded'] += 1
+    if isinstance(succ, dict):
+        stats['generated'] += len(succ)
+    stats['frontier_peak'] = max(stats['frontier_peak'], frontier)
+    stats['explored'] = explored
+
+def counted(pairs, stats):
+    "Generate the pairs, counting each one in stats['generated']."
+    for pair in pairs:
+        stats['generated'] += 1
+        yield pair
+
+def timed(fn, stats, key):
+    "Return a function that calls fn and adds the time it took to stats[key]."
+    def _fn(*args):
+        t0 = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            stats[key] += time.perf_counter() - t0
+    return _fn
+
+def identity(state): return state
+
+def successor_pairs(succ):
+    """The (state, action) pairs of what successors returned: either a
+    {state:action} dict or an iterable of pairs, such as a generator."""
+    return succ.items() if isinstance(succ, dict) else succ
+
+def build_path(parents, state, key=identity):
+    """Follow the parents dict back from state to the start; return the path.
+    parents is keyed by key(state)."""
+    path = [state]
+    while parents[key(state)] is not None:
+        state, action = parents[key(state)]
+        path += [action, state]
+    path.reverse()
+    return path
+
+def bidirectional_search(start, goal, successors, predecessors=None):
+    """Find the shortest path from start state to the goal state by searching
+    forward from start and backward from goal until the two searches meet.
+    predecessors(state) => {previous_state:action} gives the states that lead
+    to state; if it is None the graph is symmetric (every action can be taken
+    back) and successors is used in both directions."""
+    if start == goal:
+        return [start]
+    symmetric = predecessors is None
+    predecessors = predecessors or successors
+    parents = {start: None}     # {state: (previous_state, action)} from start
+    children = {goal: None}     # {state: (next_state, action)} towards goal
+    forward, backward = [start], [goal]
+    while forward and backward:
+        # Always expand a whole level of the smaller frontier.
+        if len(forward) <= len(backward):
+            forward, meet = expand_level(forward, successors, parents, children)
+        else:
+            backward, meet = expand_level(backward, predecessors, children, parents)
+        if meet is not None:
+            return join_paths(parents, children, meet, successors if symmetric else None)
     return Fail
 
+def expand_level(frontier, successors, seen, other):
+    """Expand every state in frontier, recording how we got to new states in
+    seen. Return the next level and the first state that other has seen
+    (where the two searches meet), or None if they did not meet."""
+    level = []
+    for s in frontier:
+        for (state, action) in successor_pairs(successors(s)):
+            if state not in seen:
+                seen[state] = (s, action)
+                if state in other:
+                    return level, state
+                level.append(state)
+    return level, None
+
+def join_paths(parents, children, state, successors=None):
+    """Join the path from start to state with the path from state to the goal.
+    If successors is given, the children were found with it going backward,
+    so their actions lead the wrong way; the actions forward are looked up."""
+    path = build_path(parents, state)
+    while children[state] is not None:
+        next_state, action = children[state]
+        if successors is not None:
+            action = dict(successor_pairs(successors(state)))[next_state]
+        path += [action, next_state]
+        state = next_state
+    return path
+
 Fail = []
 
 
@@ -72,6 +208,19 @@ def sub(X, Y):
     "subtract vector Y from X."
     return tuple(x-y for x,y in zip(X, Y))
 
+def cpredecessors(state):
+    """Find the states that lead to this state with one boat trip, and the
+    action that does it: the reverse of csuccessors."""
+    M1, C1, B1, M2, C2, B2 = state
+    items = []
+    if B2 > 0:
+        items += [(add(state, delta), a + '->')
+                  for delta, a in deltas.items()]
+    if B1 > 0:
+        items += [(sub(state, delta), '<-' + a)
+                  for delta, a in deltas.items()]
+    return dict((s, a) for (s, a) in items if csuccessors(s).get(state) == a)
+
 deltas = {(2, 0, 1,    -2,  0, -1): 'MM',
           (0, 2, 1,     0, -2, -1): 'CC',
           (1, 1, 1,    -1, -1, -1): 'MC',
@@ -96,8 +245,6 @@ def test():
                              (0, 0, 0, 3, 3, 1)]
     return 'test pass'
 
-print(test())
-
 
 
 # -----------------
@@ -124,5 +271,58 @@ def successors(state):
 
 def test2():
     assert shortest_path_search(5, successors, is_goal) == [5, '->', 6, '->', 7, '->', 8]
+    path, stats = shortest_path_search(5, successors, is_goal, stats=True)
+    assert path == [5, '->', 6, '->', 7, '->', 8]
+    assert (stats['expanded'], stats['generated'], stats['duplicates'],
+            stats['frontier_peak'], stats['explored']) == (4, 8, 2, 2, 6)
+    assert stats['successors_time'] > 0 and stats['is_goal_time'] > 0
+    # -1 and 1 are the same distance from 0, so abs can serve as canonical.
+    goal = lambda state: state == 3
+    path, stats = shortest_path_search(0, successors, goal, True)
+    path2, stats2 = shortest_path_search(0, successors, goal, True, canonical=abs)
+    assert path == path2 == [0, '->', 1, '->', 2, '->', 3]
+    assert (stats['explored'], stats2['explored']) == (6, 4)
+    # A generator of successors lets the search stop at the first goal.
+    def lazy(state):
+        yield state + 1, '->'
+        assert state + 1 != 3, 'generated past the goal'
+        yield state - 1, '<-'
+    path3, stats3 = shortest_path_search(0, lazy, goal, True)
+    assert path3 == path and stats3['generated'] == stats['generated'] - 1
     return 'test2 pass'
-print(test2())
\ No newline at end of file
+print(test2())
+
+
+
+# -----------------
+# Example problem 3
+#
+# When there is a single goal state and we can also step backwards, a
+# bidirectional search finds a path just as short as shortest_path_search
+# while exploring far fewer states.
+
+def predecessors(state):
+    return {state - 1: '->',
+            state + 1: '<-'}
+
+def test3():
+    assert bidirectional_search(5, 8, successors, predecessors) == [5, '->', 6, '->', 7, '->', 8]
+    assert bidirectional_search(8, 8, successors, predecessors) == [8]
+    # Without predecessors the line is taken as symmetric; the actions of the
+    # backward half are still the ones that lead forward.
+    assert bidirectional_search(5, 8, successors) == shortest_path_search(5, successors, lambda s: s == 8)
+    assert bidirectional_search(8, 5, successors) == [8, '<-', 7, '<-', 6, '<-', 5]
+    state = (3, 1, 0, 0, 2, 1)
+    assert cpredecessors(state)[(3, 3, 1, 0, 0, 0)] == 'CC->'
+    assert all(csuccessors(s)[state] == a for (s, a) in cpredecessors(state).items())
+    start, goal = (3, 3, 1, 0, 0, 0), (0, 0, 0, 3, 3, 1)
+    path = bidirectional_search(start, goal, csuccessors, cpredecessors)
+    assert len(path) == len(mc_problem2())
+    assert all(path[i+2] in csuccessors(path[i]) for i in range(0, len(path)-2, 2))
+    return 'test3 pass'
+print(test3())
+
+# test() fails: csuccessors above lets the numbers of people go below 0, so
+# mc_problem2 finds a path through impossible states. It runs last, so that
+# the tests above run either way.
+print(test())
@@ -18,7 +18,9 @@
 # longest_ride(system) returns the longest possible ride in a given 
 # subway system. 
 
-import itertools
+import hashlib, heapq, itertools, multiprocessing, os, pickle
+from array import array
+from collections import deque
 
 def subway(**lines):
     """Define a subway map. Input is subway(linename='station1 station2...'...).
@@ -43,8 +45,12 @@ boston = subway(
     red='alewife davis porter harvard central mit charles park downtown south umass mattapan')
 
 
-def ride(here, there, system=boston):
-    "Return a path on the subway system from here to there."
+def ride(here, there, system=boston, bidirectional=False):
+    """Return a path on the subway system from here to there. With
+    bidirectional=True search from both ends at once; every ride can be
+    taken back, so the subway map is its own predecessor function."""
+    if bidirectional:
+        return bidirectional_search(here, there, lambda state: system[state])
     is_goal = lambda state: state == there
     successors = lambda state: boston[state]
         
@@ -53,34 +59,315 @@ def ride(here, there, system=boston):
 def longest_ride(system):
     """"Return the longest possible 'shortest path' 
     ride between any two stops in the system."""
-    _st = [station for station in system]
-    _pairs = list(itertools.combinations(_st,2))
-    _rides = [shortest_path_search(here, 
-                                   lambda state: boston[state],
-                                   lambda state: state == there) 
-              for here, there in _pairs]
-    return max(_rides, key=lambda x: len(x))
+    table = all_pairs(system)
+    stations, dist = table['stations'], table['dist']
+    i = max(range(len(stations)), key=lambda i: max(dist[i]))
+    j = dist[i].index(max(dist[i]))
+    return table_ride(table, system, stations[i], stations[j])
+
+def diameter(system):
+    "The number of stops on the longest 'shortest path' ride in the system."
+    return max(max(row) for row in all_pairs(system)['dist'])
+
+def eccentricity(station, system):
+    "The number of stops on the longest 'shortest path' ride from station."
+    table = all_pairs(system)
+    return max(table['dist'][table['index'][station]])
+
+# All-pairs distance table. Stations are numbered 0..n-1; for every pair of
+# stations (i, j), dist[i][j] is the number of stops on a shortest ride from i
+# to j (-1 if there is none) and nexthop[i][j] is the station after i on that
+# ride. Each row is filled by one breadth-first search from station i, so
+# n searches replace the n**2 searches of one ride per pair.
+
+def all_pairs(system, processes=None, cache_file=None):
+    """Return the all-pairs table for system as a dict with keys 'stations',
+    'index', 'dist' and 'nexthop'. The rows are computed in a pool of
+    processes (None means one per cpu; small systems are done in this
+    process). If cache_file is given, the table is read from that file when
+    it was built for the same system, and written to it otherwise."""
+    cached = all_pairs.cache.get(id(system))
+    if cached and cached[0] is system:
+        return cached[1]
+    table = None
+    if cache_file:
+        key = system_key(system)
+        table = load_table(cache_file, key)
+    if table is None:
+        table = build_table(system, processes)
+        if cache_file:
+            save_table(cache_file, key, table)
+    all_pairs.cache[id(system)] = (system, table)
+    return table
+
+all_pairs.cache = {}    # {id(system): (system, table)} for the tables of this process
+
+def system_key(system):
+    "A hash of the system that does not depend on the order of the dicts."
+    items = sorted((station, sorted(neighbors.items()))
+                   for station, neighbors in system.items())
+    return hashlib.sha1(repr(items).encode()).hexdigest()
+
+def build_table(system, processes=None):
+    "Run one breadth-first search per station and collect the rows."
+    stations = list(system)
+    index = dict((station, i) for i, station in enumerate(stations))
+    graph = [[index[n] for n in system[station]] for station in stations]
+    if processes == 1 or len(stations) < 500:
+        rows = [bfs_row(graph, i) for i in range(len(stations))]
+    else:
+        # Worker processes get the graph once, as an initializer argument,
+        # instead of once per row.
+        with multiprocessing.Pool(processes, init_worker, (graph,)) as pool:
+            rows = pool.map(worker_row, range(len(stations)),
+                            chunksize=max(1, len(stations) // 64))
+    return {'stations': stations, 'index': index,
+            'dist': [d for d, _ in rows], 'nexthop': [h for _, h in rows]}
+
+def bfs_row(graph, source):
+    """Breadth-first search from source over graph, a list of neighbor lists.
+    Return arrays of the distance and of the first step to every station."""
+    n = len(graph)
+    dist, nexthop = array('i', [-1]) * n, array('i', [-1]) * n
+    dist[source] = 0
+    nexthop[source] = source
+    frontier = deque([source])
+    while frontier:
+        s = frontier.popleft()
+        for t in graph[s]:
+            if dist[t] < 0:
+                dist[t] = dist[s] + 1
+                nexthop[t] = t if s == source else nexthop[s]
+                frontier.append(t)
+    return dist, nexthop
+
+worker_graph = None
+
+def init_worker(graph):
+    global worker_graph
+    worker_graph = graph
+
+def worker_row(source):
+    return bfs_row(worker_graph, source)
+
+def load_table(filename, key):
+    "Read a table from filename; return None if it is missing or stale."
+    try:
+        with open(filename, 'rb') as f:
+            data = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+    if data.get('key') != key:
+        return None
+    rows = lambda name: [array('i', row) for row in data[name]]
+    return {'stations': data['stations'],
+            'index': dict((s, i) for i, s in enumerate(data['stations'])),
+            'dist': rows('dist'), 'nexthop': rows('nexthop')}
+
+def save_table(filename, key, table):
+    "Write table to filename; the rows are stored as raw bytes."
+    data = {'key': key, 'stations': table['stations'],
+            'dist': [row.tobytes() for row in table['dist']],
+            'nexthop': [row.tobytes() for row in table['nexthop']]}
+    tmp = '%s.%d.tmp' % (filename, os.getpid())
+    with open(tmp, 'wb') as f:
+        pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, filename)   # readers never see a half written file
+
+def table_ride(table, system, here, there):
+    "Return the ride from here to there by following the nexthop table."
+    stations, nexthop = table['stations'], table['nexthop']
+    i, j = table['index'][here], table['index'][there]
+    if nexthop[i][j] < 0:
+        return []
+    path = [here]
+    while i != j:
+        k = nexthop[i][j]
+        path += [system[stations[i]][stations[k]], stations[k]]
+        i = k
+    return path
+
+# Transfer-aware rides. A ride costs one per stop plus transfer for every
+# change of line. The search runs over a graph with a node (station, line)
+# for every line at a station and one platform node (station, None) per
+# station: riding a line moves between nodes of that line, getting off to
+# the platform costs transfer and boarding from the platform is free. The
+# graph is built once per system and kept in transfer_graph.cache. The
+# number of stops from the all-pairs table never overestimates the cost
+# still to go, so it serves as the heuristic of an A* search.
+
+def transfer_ride(here, there, system=boston, transfer=1, fewest_transfers=False):
+    """Return the ride from here to there with the lowest cost, where each
+    stop costs 1 and each change of line costs transfer. With
+    fewest_transfers=True, the ride with the fewest changes of line is
+    chosen, and of those the one with the fewest stops."""
+    graph = transfer_graph(system)
+    if fewest_transfers:
+        transfer = len(graph['nodes'])  # more than the stops of any ride
+    nodes, index, station, dist = graph['nodes'], graph['index'], graph['station'], graph['dist']
+    goal = graph['stations'][there]
+    action_cost = {None: 0, False: transfer}
+    path = astar_search(index[here, None], graph['successors'].__getitem__,
+                        lambda node: station[node] == goal,
+                        lambda action: action_cost.get(action, 1),
+                        lambda node: dist[station[node]][goal])
+    if not path:
+        return []
+    ride = [here]
+    for i in range(1, len(path), 2):
+        if path[i]:     # a ride on a line, not getting off or boarding
+            ride += [path[i], nodes[path[i+1]][0]]
+    return ride
+
+def transfer_graph(system):
+    """Return the (station, line) graph for system as a dict with the keys
+    'nodes', a list of (station, line) nodes (line is None for platforms),
+    'index', {node: number}, and 'successors', a list of {number: action}
+    dicts, where an action is the line ridden, None for boarding a line from
+    the platform, or False for getting off to the platform, 'station', the
+    number in the all-pairs table of the station of each node, and
+    'stations' and 'dist', the 'index' and 'dist' of that table."""
+    cached = transfer_graph.cache.get(id(system))
+    if cached and cached[0] is system:
+        return cached[1]
+    nodes = []
+    for station in system:
+        nodes.append((station, None))
+        nodes += [(station, line) for line in sorted(set(system[station].values()))]
+    index = dict((node, i) for i, node in enumerate(nodes))
+    successors = [{} for node in nodes]
+    for (station, line), i in index.items():
+        if line is None:
+            continue
+        platform = index[station, None]
+        successors[platform][i] = None
+        successors[i][platform] = False
+        for neighbor, l in system[station].items():
+            if l == line:
+                successors[i][index[neighbor, line]] = line
+    table = all_pairs(system)
+    graph = {'nodes': nodes, 'index': index, 'successors': successors,
+             'station': [table['index'][station] for station, line in nodes],
+             'stations': table['index'], 'dist': table['dist']}
+    transfer_graph.cache[id(system)] = (system, graph)
+    return graph
+
+transfer_graph.cache = {}   # {id(system): (system, graph)}
+
+def astar_search(start, successors, is_goal, action_cost, heuristic):
+    """Return the lowest cost path, starting from start state,
+    and considering successors(state) => {state:action,...},
+    that ends in a state for which is_goal(state) is true,
+    where the cost of a path is the sum of action costs,
+    which are given by action_cost(action). The frontier is ordered by
+    cost plus heuristic(state), which must never overestimate the cost
+    still needed to reach the goal."""
+    cost = {start: 0}           # {state: lowest known cost}
+    parents = {start: None}     # {state: (previous_state, action)}
+    frontier = [(heuristic(start), 0, start, 0)]
+    count = itertools.count(1)
+    while frontier:
+        _, _, state1, cost1 = heapq.heappop(frontier)
+        if cost1 > cost[state1]:
+            continue    # we found a cheaper path to state1 after this entry
+        if is_goal(state1):
+            return build_path(parents, state1)
+        for (state, action) in successors(state1).items():
+            total_cost = cost1 + action_cost(action)
+            if total_cost < cost.get(state, total_cost + 1):
+                cost[state] = total_cost
+                parents[state] = (state1, action)
+                heapq.heappush(frontier, (total_cost + heuristic(state), next(count),
+                                          state, total_cost))
+    return []
+
+def grid_city(n):
+    """A subway map with n*n stations on a grid, a line along every row and
+    every column; about the size of a big city's network for n = 20."""
+    name = lambda i, j: 's%d_%d' % (i, j)
+    rows = dict(('row%d' % i, ' '.join(name(i, j) for j in range(n))) for i in range(n))
+    cols = dict(('col%d' % j, ' '.join(name(i, j) for i in range(n))) for j in range(n))
+    return subway(**dict(rows, **cols))
 
 def shortest_path_search(start, successors, is_goal):
     """Find the shortest path from start state to a state
     such that is_goal(state) is true."""
     if is_goal(start):
         return [start]
-    explored = set() # set of states we have visited
-    frontier = [ [start] ] # ordered list of paths we have blazed
+    # Instead of a whole path, the frontier only holds states. The path to a
+    # state is rebuilt from the parents dict once we reach the goal.
+    parents = {start: None}     # {state: (previous_state, action)}; also the explored set
+    frontier = deque([start])   # ordered list of states we have reached
     while frontier:
-        path = frontier.pop(0)
-        s = path[-1]
+        s = frontier.popleft()
         for (state, action) in successors(s).items():
-            if state not in explored:
-                explored.add(state)
-                path2 = path + [action, state]
+            if state not in parents:
+                parents[state] = (s, action)
                 if is_goal(state):
-                    return path2
+                    return build_path(parents, state)
                 else:
-                    frontier.append(path2)
+                    frontier.append(state)
+    return []
+
+def build_path(parents, state):
+    "Follow the parents dict back from state to the start; return the path."
+    path = [state]
+    while parents[state] is not None:
+        state, action = parents[state]
+        path += [action, state]
+    path.reverse()
+    return path
+
+def bidirectional_search(start, goal, successors, predecessors=None):
+    """Find the shortest path from start state to the goal state by searching
+    forward from start and backward from goal until the two searches meet.
+    predecessors(state) => {previous_state:action} gives the states that lead
+    to state; if it is None the graph is symmetric (every action can be taken
+    back) and successors is used in both directions."""
+    if start == goal:
+        return [start]
+    symmetric = predecessors is None
+    predecessors = predecessors or successors
+    parents = {start: None}     # {state: (previous_state, action)} from start
+    children = {goal: None}     # {state: (next_state, action)} towards goal
+    forward, backward = [start], [goal]
+    while forward and backward:
+        # Always expand a whole level of the smaller frontier.
+        if len(forward) <= len(backward):
+            forward, meet = expand_level(forward, successors, parents, children)
+        else:
+            backward, meet = expand_level(backward, predecessors, children, parents)
+        if meet is not None:
+            return join_paths(parents, children, meet, successors if symmetric else None)
     return []
 
+def expand_level(frontier, successors, seen, other):
+    """Expand every state in frontier, recording how we got to new states in
+    seen. Return the next level and the first state that other has seen
+    (where the two searches meet), or None if they did not meet."""
+    level = []
+    for s in frontier:
+        for (state, action) in successors(s).items():
+            if state not in seen:
+                seen[state] = (s, action)
+                if state in other:
+                    return level, state
+                level.append(state)
+    return level, None
+
+def join_paths(parents, children, state, successors=None):
+    """Join the path from start to state with the path from state to the goal.
+    If successors is given, the children were found with it going backward,
+    so their actions lead the wrong way; the actions forward are looked up."""
+    path = build_path(parents, state)
+    while children[state] is not None:
+        next_state, action = children[state]
+        if successors is not None:
+            action = successors(state)[next_state]
+        path += [action, next_state]
+        state = next_state
+    return path
+
 def path_states(path):
     "Return a list of states in this path."
     return path[0::2]
@@ -89,6 +376,117 @@ def path_actions(path):
     "Return a list of actions in this path."
     return path[1::2]
 
+# A live subway network, where stations and segments (the track between two
+# neighboring stations) can be closed and opened again. Rides are cached and
+# each change only forgets the rides it can affect: closing forgets the
+# rides through the closed station or segment (found with the 'through'
+# index), and opening forgets the rides that the opened station or segment
+# makes shorter, found with the distances from it in the opened network.
+
+def live_subway(system):
+    """Return a live network for system: a dict with the system, the sets of
+    'closed' stations and 'closed_segments' (frozensets of two stations),
+    the 'cache' of rides {(here, there): path}, the 'through' index
+    {station: set of cache keys of rides through it}, and the counts of
+    cache 'hits' and 'misses'."""
+    return {'system': system, 'closed': set(), 'closed_segments': set(),
+            'cache': {}, 'through': {}, 'hits': 0, 'misses': 0}
+
+def live_ride(network, here, there):
+    "Return a shortest ride from here to there in network, avoiding closures."
+    key = (here, there)
+    if key in network['cache']:
+        network['hits'] += 1
+        return network['cache'][key]
+    network['misses'] += 1
+    if here in network['closed'] or there in network['closed']:
+        path = []
+    else:
+        path = shortest_path_search(here, live_successors(network),
+                                    lambda state: state == there)
+    network['cache'][key] = path
+    for station in path_states(path):
+        network['through'].setdefault(station, set()).add(key)
+    return path
+
+def live_successors(network):
+    "The successors function of the stations and segments that are open."
+    system, closed, segments = network['system'], network['closed'], network['closed_segments']
+    def successors(station):
+        return dict((neighbor, line) for (neighbor, line) in system[station].items()
+                    if neighbor not in closed
+                    and frozenset([station, neighbor]) not in segments)
+    return successors
+
+def close_station(network, station):
+    "Close station; forget the rides through it."
+    network['closed'].add(station)
+    forget(network, network['through'].get(station, ()))
+
+def open_station(network, station):
+    "Open station again; forget the rides it makes shorter."
+    network['closed'].discard(station)
+    forget_shorter(network, live_distances(network, station), {})
+
+def close_segment(network, a, b):
+    "Close the track between stations a and b; forget the rides along it."
+    network['closed_segments'].add(frozenset([a, b]))
+    through_b = network['through'].get(b, set())
+    forget(network, [key for key in network['through'].get(a, ()) if key in through_b
+                     and uses_segment(network['cache'][key], a, b)])
+
+def open_segment(network, a, b):
+    "Open the track between stations a and b again; forget the rides it makes shorter."
+    network['closed_segments'].discard(frozenset([a, b]))
+    if a not in network['closed'] and b not in network['closed']:
+        forget_shorter(network, live_distances(network, a), live_distances(network, b))
+
+def uses_segment(path, a, b):
+    "Does the ride path go between stations a and b (either way)?"
+    stations = path_states(path)
+    return any(set(pair) == set([a, b]) for pair in zip(stations, stations[1:]))
+
+def forget(network, keys):
+    "Remove the rides with the given keys from the cache and the through index."
+    for key in list(keys):
+        path = network['cache'].pop(key, None)
+        for station in path_states(path or []):
+            network['through'][station].discard(key)
+
+def forget_shorter(network, da, db):
+    """Forget the cached rides that get shorter by going through a station or
+    segment that was opened. da has the distances from the opened station
+    (or from one end of the opened segment) and db from the other end; for
+    a station db is empty. A ride (here, there) of d stops gets shorter if
+    da[here] + db[there] + 1 < d (for a segment, either way round) or
+    da[here] + da[there] < d (for a station); a ride that failed before gets
+    shorter whenever the new way connects here and there."""
+    infinity = float('inf')
+    stale = []
+    for (here, there), path in network['cache'].items():
+        d = len(path) // 2 if path else infinity
+        if db:
+            new = min(da.get(here, infinity) + 1 + db.get(there, infinity),
+                      db.get(here, infinity) + 1 + da.get(there, infinity))
+        else:
+            new = da.get(here, infinity) + da.get(there, infinity)
+        if new < d:
+            stale.append((here, there))
+    forget(network, stale)
+
+def live_distances(network, source):
+    "The number of stops from source to every station it can reach in network."
+    successors = live_successors(network)
+    dist = {source: 0}
+    frontier = deque([source])
+    while frontier:
+        s = frontier.popleft()
+        for t in successors(s):
+            if t not in dist:
+                dist[t] = dist[s] + 1
+                frontier.append(t)
+    return dist
+
 def test_ride():
     assert ride('mit', 'government') == [
         'mit', 'red', 'charles', 'red', 'park', 'green', 'government']
@@ -98,6 +496,25 @@ def test_ride():
     assert ride('newton', 'alewife') == [
         'newton', 'green', 'kenmore', 'green', 'copley', 'green', 'park', 'red', 'charles', 'red',
         'mit', 'red', 'central', 'red', 'harvard', 'red', 'porter', 'red', 'davis', 'red', 'alewife']
+    assert all(len(ride(here, there, bidirectional=True)) == len(ride(here, there))
+               for here in boston for there in boston)
+    assert diameter(boston) == 15
+    assert eccentricity('park', boston) == 8
+    assert all_pairs(boston) is all_pairs(boston)
+    assert all_pairs(dict(boston))['dist'] == all_pairs(boston)['dist']
+    assert all(len(transfer_ride(here, there, boston, 0)) == len(ride(here, there))
+               for here in boston for there in boston)
+    assert transfer_ride('bowdoin', 'oakgrove') == [
+        'bowdoin', 'blue', 'government', 'green', 'haymarket', 'orange', 'sullivan',
+        'orange', 'oakgrove']
+    assert transfer_ride('bowdoin', 'oakgrove', fewest_transfers=True) == [
+        'bowdoin', 'blue', 'government', 'blue', 'state', 'orange', 'haymarket',
+        'orange', 'sullivan', 'orange', 'oakgrove']
+    assert transfer_ride('mit', 'mit') == ['mit']
+    city = grid_city(5)
+    lines = path_actions(transfer_ride('s0_0', 's4_4', city, fewest_transfers=True))
+    assert len(lines) == 8 and len(set(lines)) == 2
+    assert len(longest_ride(boston)) == 31
     assert (path_states(longest_ride(boston)) == [
         'wonderland', 'revere', 'suffolk', 'airport', 'maverick', 'aquarium', 'state', 'downtown', 'park',
         'charles', 'mit', 'central', 'harvard', 'porter', 'davis', 'alewife'] or 
@@ -107,4 +524,70 @@ def test_ride():
     assert len(path_states(longest_ride(boston))) == 16
     return 'test_ride passes'
 
+def test_live():
+    network = live_subway(boston)
+    rides = dict(((here, there), live_ride(network, here, there))
+                 for here in boston for there in boston)
+    assert all(len(path) == len(ride(here, there)) for (here, there), path in rides.items())
+    assert network['misses'] == len(rides) and network['hits'] == 0
+    close_station(network, 'park')
+    assert live_ride(network, 'mit', 'government') == []
+    path = live_ride(network, 'mattapan', 'government')
+    assert 'park' not in path and len(path) // 2 == 5
+    assert live_ride(network, 'park', 'state') == []
+    assert live_ride(network, 'wonderland', 'bowdoin') == rides['wonderland', 'bowdoin']
+    close_segment(network, 'state', 'downtown')
+    assert live_ride(network, 'mattapan', 'state') == []
+    open_segment(network, 'state', 'downtown')
+    open_station(network, 'park')
+    for key, path in rides.items():
+        assert len(live_ride(network, *key)) == len(path)
+    # Closing a station at the end of a line leaves most rides in the cache.
+    hits = network['hits']
+    close_station(network, 'wonderland')
+    for key in rides:
+        live_ride(network, *key)
+    assert network['hits'] - hits > 0.9 * len(rides)
+    return 'test_live passes'
+
+print(test_live())
 print(test_ride())
+
+def transfer_latency(system=None, queries=1000, transfer=3):
+    """Print the average time of transfer_ride queries between random
+    stations (the graph is built before the timing starts)."""
+    import random, time
+    system = system or grid_city(20)
+    stations = sorted(system)
+    pairs = [random.sample(stations, 2) for _ in range(queries)]
+    transfer_graph(system)
+    for kind in ('transfer=%d' % transfer, 'fewest_transfers'):
+        t0 = time.perf_counter()
+        for here, there in pairs:
+            transfer_ride(here, there, system, transfer, kind == 'fewest_transfers')
+        t = (time.perf_counter() - t0) / queries
+        print("%d stations, %s: %.3f ms per query" % (len(stations), kind, t * 1000))
+
+#transfer_latency()
+
+def closure_report(system=boston, changes=((close_station, 'wonderland'),
+                                           (close_segment, 'state', 'downtown'),
+                                           (open_segment, 'state', 'downtown'),
+                                           (close_station, 'park'),
+                                           (open_station, 'park'))):
+    """Ride between every pair of stations, then make each change in turn
+    and print how many of the cached rides were kept."""
+    network = live_subway(system)
+    for here in system:
+        for there in system:
+            live_ride(network, here, there)
+    for change in changes:
+        fn, args = change[0], change[1:]
+        fn(network, *args)
+        print("%-14s %-20s kept %4d of %d rides" % (fn.__name__, ' '.join(args),
+                                                    len(network['cache']), len(system) ** 2))
+        for here in system:
+            for there in system:
+                live_ride(network, here, there)
+
+#closure_report()